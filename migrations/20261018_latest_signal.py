@@ -0,0 +1,19 @@
+import sliver.core
+import sliver.database as db
+from sliver.strategy import LatestSignal
+
+db.init()
+
+with db.connection.atomic():
+    db.connection.create_tables([LatestSignal])
+
+    db.connection.execute_sql(
+        """
+        INSERT INTO latestsignal (strategy_id, signal, time, refreshed_at)
+        SELECT DISTINCT ON (indicator.strategy_id)
+            indicator.strategy_id, indicator.signal, price.time, now()
+        FROM indicator
+        JOIN price ON price.id = indicator.price_id
+        ORDER BY indicator.strategy_id, price.time DESC
+        """
+    )
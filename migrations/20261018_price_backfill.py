@@ -0,0 +1,8 @@
+import sliver.core
+import sliver.database as db
+from sliver.price import PriceBackfill
+
+db.init()
+
+db.connection.create_tables([PriceBackfill])
+PriceBackfill._schema.create_foreign_key(PriceBackfill.market)
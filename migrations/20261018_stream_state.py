@@ -0,0 +1,7 @@
+import sliver.core
+import sliver.database as db
+from sliver.strategy import StreamState
+
+db.init()
+
+db.connection.create_tables([StreamState])
@@ -0,0 +1,72 @@
+import sliver.database as db
+
+db.init()
+
+with db.connection.atomic():
+    db.connection.execute_sql(
+        """
+        CREATE OR REPLACE FUNCTION watchdog_notify() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('watchdog', TG_TABLE_NAME || ' ' || NEW.id);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+
+    db.connection.execute_sql(
+        """
+        CREATE TRIGGER strategy_watchdog_insert
+        AFTER INSERT ON strategy
+        FOR EACH ROW EXECUTE FUNCTION watchdog_notify()
+        """
+    )
+    db.connection.execute_sql(
+        """
+        CREATE TRIGGER strategy_watchdog_update
+        AFTER UPDATE ON strategy
+        FOR EACH ROW WHEN (
+            OLD.status IS DISTINCT FROM NEW.status
+            OR OLD.next_refresh IS DISTINCT FROM NEW.next_refresh
+        )
+        EXECUTE FUNCTION watchdog_notify()
+        """
+    )
+
+    db.connection.execute_sql(
+        """
+        CREATE TRIGGER position_watchdog_insert
+        AFTER INSERT ON position
+        FOR EACH ROW EXECUTE FUNCTION watchdog_notify()
+        """
+    )
+    db.connection.execute_sql(
+        """
+        CREATE TRIGGER position_watchdog_update
+        AFTER UPDATE ON position
+        FOR EACH ROW WHEN (
+            OLD.status IS DISTINCT FROM NEW.status
+            OR OLD.next_refresh IS DISTINCT FROM NEW.next_refresh
+            OR OLD.refreshing IS DISTINCT FROM NEW.refreshing
+        )
+        EXECUTE FUNCTION watchdog_notify()
+        """
+    )
+
+    # positions are scheduled only while subscribed, the watchdog resyncs those
+    # of a user strategy when it's notified
+    db.connection.execute_sql(
+        """
+        CREATE TRIGGER userstrategy_watchdog_insert
+        AFTER INSERT ON userstrategy
+        FOR EACH ROW EXECUTE FUNCTION watchdog_notify()
+        """
+    )
+    db.connection.execute_sql(
+        """
+        CREATE TRIGGER userstrategy_watchdog_update
+        AFTER UPDATE ON userstrategy
+        FOR EACH ROW WHEN (OLD.active IS DISTINCT FROM NEW.active)
+        EXECUTE FUNCTION watchdog_notify()
+        """
+    )
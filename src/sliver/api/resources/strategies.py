@@ -19,13 +19,7 @@ class Strategies(Resource):
         uid = int(get_jwt_identity())
         user = User.get_by_id(uid)
 
-        strat_list = []
-        for s in Strategy.get_existing():
-            s.subscribed = user.is_subscribed(s.id)
-            s.signal = s.get_signal()
-            strat_list.append(s)
-
-        return strat_list
+        return list(user.get_strategies())
 
     @marshal_with(base_fields)
     @jwt_required()
@@ -56,14 +50,8 @@ class StrategiesByMarket(Resource):
         uid = int(get_jwt_identity())
         user = User.get_by_id(uid)
 
-        strat_list = []
-        for strategy in [s for s in Strategy.get_existing()]:
-            if (
-                strategy.market_id == int(market_id)
-                and strategy.type != StrategyTypes.MIXER
-                and strategy.type != StrategyTypes.MANUAL
-            ):
-                strategy.subscribed = user.is_subscribed(strategy.id)
-                strat_list.append(strategy)
-
-        return strat_list
+        return list(
+            user.get_strategies()
+            .where(Strategy.market == int(market_id))
+            .where(Strategy.type.not_in([StrategyTypes.MIXER, StrategyTypes.MANUAL]))
+        )
@@ -58,6 +58,14 @@ class Config(metaclass=ConfigMeta):
 
         config = dict(zip(config, [os.environ[var] for var in config]))
 
+        optional = {
+            "TICKER_CACHE_TTL": "5",
+            "BALANCE_CACHE_TTL": "30",
+        }
+
+        for var, default in optional.items():
+            config[var] = os.environ.get(var, default)
+
         if not os.path.exists(config["ETC_DIR"]):
             raise BaseError(f"ETC_DIR={config['ETC_DIR']} not found")
         if not os.path.exists(config["LOGS_DIR"]):
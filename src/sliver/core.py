@@ -5,18 +5,19 @@ import waitress
 
 from sliver.asset import Asset
 from sliver.trade_engine import TradeEngine
-from sliver.price import Price
+from sliver.price import Price, PriceBackfill
 from sliver.exchange import Exchange
 from sliver.market import Market
 from sliver.exchange_asset import ExchangeAsset
 from sliver.credential import Credential
 from sliver.balance import Balance
 from sliver.indicator import Indicator
-from sliver.strategy import BaseStrategy
+from sliver.strategy import BaseStrategy, LatestSignal, StreamState
 from sliver.user_strategy import UserStrategy
 from sliver.user import User
 from sliver.order import Order
 from sliver.position import Position
+from sliver.strategies.factory import StrategyFactory
 
 from sliver.watchdog import Watchdog
 from sliver.config import Config
@@ -29,6 +30,7 @@ __all__ = [
     "Asset",
     "TradeEngine",
     "Price",
+    "PriceBackfill",
     "Exchange",
     "Market",
     "ExchangeAsset",
@@ -36,6 +38,8 @@ __all__ = [
     "Balance",
     "Indicator",
     "BaseStrategy",
+    "LatestSignal",
+    "StreamState",
     "UserStrategy",
     "User",
     "Order",
@@ -51,6 +55,7 @@ def create_tables():
             Asset,
             TradeEngine,
             Price,
+            PriceBackfill,
             Exchange,
             Market,
             ExchangeAsset,
@@ -58,6 +63,8 @@ def create_tables():
             Balance,
             Indicator,
             BaseStrategy,
+            LatestSignal,
+            StreamState,
             UserStrategy,
             User,
             Order,
@@ -65,9 +72,11 @@ def create_tables():
         ],
         safe=True,
     )
+    StrategyFactory.setup_all()
     try:
         TradeEngine._schema.create_foreign_key(TradeEngine.creator)
         Price._schema.create_foreign_key(Price.market)
+        PriceBackfill._schema.create_foreign_key(PriceBackfill.market)
         Credential._schema.create_foreign_key(Credential.user)
         Balance._schema.create_foreign_key(Balance.user)
         Indicator._schema.create_foreign_key(Indicator.strategy)
@@ -81,8 +90,14 @@ def create_tables():
 def watch(num_workers=1):
     argp = argparse.ArgumentParser()
     argp.add_argument("num_workers", nargs="?", type=int, default=num_workers)
+    argp.add_argument("--scheduler", action="store_true")
+    argp.add_argument("--routing", action="store_true")
     args = argp.parse_args()
-    Watchdog(num_workers=args.num_workers).run()
+    Watchdog(
+        num_workers=args.num_workers,
+        scheduler=args.scheduler,
+        routing=args.routing,
+    ).run()
 
 
 def serve():
@@ -1,3 +1,5 @@
+import csv
+import io
 from abc import ABCMeta
 
 import peewee
@@ -6,6 +8,9 @@ from sliver.config import Config
 
 connection = peewee.PostgresqlDatabase(None)
 
+# upserts of at least this many rows are streamed through COPY
+COPY_THRESHOLD = 10000
+
 
 def init():
     connection.init(
@@ -16,8 +21,102 @@ def init():
     )
 
 
+def upsert(model, fields, rows, conflict, returning=None):
+    # inserts rows (tuples of db values for fields), updating the fields not in
+    # conflict when they already exist; returns the returning values of each row
+    if len(rows) >= COPY_THRESHOLD:
+        return copy_upsert(model, fields, rows, conflict, returning)
+
+    query = model.insert_many(rows, fields=fields).on_conflict(
+        conflict_target=conflict,
+        preserve=[f for f in fields if not any(f is c for c in conflict)],
+    )
+
+    if returning is None:
+        return query.execute()
+
+    return list(query.returning(*returning).tuples().execute())
+
+
+def copy_upsert(model, fields, rows, conflict, returning=None):
+    # loads rows with COPY into a temporary table and merges them into the
+    # model table in one statement; must run inside a transaction
+    table = model._meta.table_name
+    staging = f"{table}_copy"
+
+    def names(fields):
+        return ", ".join(f'"{f.column_name}"' for f in fields)
+
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+
+    updates = ", ".join(
+        f'"{f.column_name}" = EXCLUDED."{f.column_name}"'
+        for f in fields
+        if not any(f is c for c in conflict)
+    )
+
+    sql = (
+        f'INSERT INTO "{table}" ({names(fields)}) '
+        f"SELECT {names(fields)} FROM {staging} "
+        f"ON CONFLICT ({names(conflict)}) DO UPDATE SET {updates}"
+    )
+    if returning is not None:
+        sql += f" RETURNING {names(returning)}"
+
+    cursor = connection.cursor()
+    cursor.execute(
+        f"CREATE TEMPORARY TABLE {staging} ON COMMIT DROP AS "
+        f'SELECT {names(fields)} FROM "{table}" WITH NO DATA'
+    )
+    cursor.copy_expert(
+        f"COPY {staging} ({names(fields)}) FROM STDIN WITH (FORMAT csv)", buffer
+    )
+    cursor.execute(sql)
+    result = cursor.fetchall() if returning is not None else cursor.rowcount
+    cursor.execute(f"DROP TABLE {staging}")
+
+    return result
+
+
 class BaseModel(peewee.Model):
     __metaclass__ = ABCMeta
 
     class Meta:
         database = connection
+
+
+class IdentityMap:
+    # keeps one instance per row for graphs of rows loaded together, so rows
+    # joined more than once or shared by several objects are the same instance,
+    # and foreign keys to rows already mapped are served from here
+
+    def __init__(self):
+        self.objects = {}
+
+    def add(self, obj):
+        # maps obj and the rows joined to it, returning the mapped instance
+        key = (type(obj), obj.get_id())
+        if key in self.objects:
+            return self.objects[key]
+
+        self.objects[key] = obj
+        for name, rel in list(obj.__rel__.items()):
+            if isinstance(rel, peewee.Model):
+                obj.__rel__[name] = self.add(rel)
+
+        return obj
+
+    def link(self):
+        # resolves the foreign keys that were not joined, if their row is mapped
+        for obj in list(self.objects.values()):
+            for field in obj._meta.refs:
+                if field.name in obj.__rel__:
+                    continue
+                if field.rel_field is not field.rel_model._meta.primary_key:
+                    continue
+
+                key = (field.rel_model, obj.__data__.get(field.name))
+                if key in self.objects:
+                    obj.__rel__[field.name] = self.objects[key]
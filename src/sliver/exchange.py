@@ -1,14 +1,15 @@
+import concurrent.futures
 import datetime
+import queue
 import time
 from abc import ABCMeta, abstractmethod
 from logging import info
 
-import pandas
 import peewee
 
 import sliver.database as db
 from sliver.exceptions import DisablingError, PostponingError
-from sliver.price import Price
+from sliver.price import Price, PriceBackfill, PriceBuffer
 from sliver.strategies.status import StrategyStatus
 from sliver.utils import get_timeframe_delta
 
@@ -29,6 +30,12 @@ class Exchange(db.BaseModel):
     api_endpoint = peewee.TextField(null=True)
     api_sandbox_endpoint = peewee.TextField(null=True)
 
+    # backfills fetch windows of backfill_window_pages pages, backfill_workers
+    # at a time, starting from the first candle after backfill_since
+    backfill_since = datetime.datetime(2010, 1, 1)
+    backfill_window_pages = 10
+    backfill_workers = 4
+
     class Meta:
         table_function = table_function
 
@@ -66,6 +73,10 @@ class Exchange(db.BaseModel):
     def api_fetch_last_price(self, symbol):
         ...
 
+    def api_fetch_tickers(self, symbols):
+        # returns None if unsupported
+        return None
+
     @api_call
     @abstractmethod
     def api_fetch_ohlcv(
@@ -124,6 +135,12 @@ class Exchange(db.BaseModel):
         # if timeframe not in api.timeframes:
         #     raise BaseError("timeframe not supported")
 
+        windows = PriceBackfill.get_pending(market, timeframe)
+        if not windows and not Price.get_by_market(market, timeframe).exists():
+            windows = self.plan_backfill(market, timeframe)
+        if windows:
+            self.backfill_ohlcv(market, timeframe, windows)
+
         try:
             last_entry = (
                 Price.get_by_market(market, timeframe)
@@ -138,9 +155,12 @@ class Exchange(db.BaseModel):
             page_start = None
             fetch_all = True
 
-        prices = pandas.DataFrame(
-            columns=["time", "open", "high", "low", "close", "volume"]
-        )
+        if fetch_all:
+            prices = PriceBuffer()
+        else:
+            prices = PriceBuffer(
+                int((datetime.datetime.utcnow() - page_start) / tf_delta) + 1
+            )
 
         default_page_size = None
 
@@ -166,7 +186,7 @@ class Exchange(db.BaseModel):
             page_first = page.iloc[0].time
             page_last = page.iloc[-1].time
             info(f"received prices from {page_first} to {page_last}")
-            prices = pandas.concat([prices, page])
+            prices.append(page)
 
             if (
                 (page_start is not None and page_start != page_first)
@@ -178,21 +198,8 @@ class Exchange(db.BaseModel):
 
             page_start = page_first - page_size * tf_delta
 
-        prices = prices.sort_values(by="time")
-        prices = prices.drop_duplicates()
-
-        prices["timeframe"] = timeframe
-        prices["market_id"] = market.id
-
-        prices[["open", "high", "low", "close"]] = prices[
-            ["open", "high", "low", "close"]
-        ].applymap(market.quote.transform)
-
-        prices["volume"] = prices["volume"].apply(market.base.transform)
-
         with db.connection.atomic():
-            if not prices.empty:
-                Price.insert_many(prices.to_dict("records")).execute()
+            prices = self.save_ohlcv(market, timeframe, prices)
 
             from sliver.strategy import BaseStrategy
 
@@ -202,6 +209,128 @@ class Exchange(db.BaseModel):
 
         return prices
 
+    def save_ohlcv(self, market, timeframe, prices):
+        prices = prices.to_frame()
+
+        prices["timeframe"] = timeframe
+        prices["market_id"] = market.id
+
+        columns = ["open", "high", "low", "close"]
+        prices[columns] = market.quote.transform_array(prices[columns])
+        prices["volume"] = market.base.transform_array(prices["volume"])
+
+        if not prices.empty:
+            Price.copy_upsert(prices)
+
+        return prices
+
+    def plan_backfill(self, market, timeframe):
+        # splits the history before the latest page into windows; returns none
+        # if the exchange can't fetch from a given time, so it is walked back
+        tf_delta = get_timeframe_delta(timeframe)
+
+        latest = self.api_fetch_ohlcv(market.get_symbol(), timeframe)
+        first = self.api_fetch_ohlcv(
+            market.get_symbol(), timeframe, since=self.backfill_since, limit=1
+        )
+        if latest is None or first is None or latest.empty or first.empty:
+            return []
+
+        start = first.iloc[0].time
+        end = latest.iloc[0].time
+        if start >= end:
+            return []
+
+        step = len(latest) * self.backfill_window_pages * tf_delta
+
+        windows = []
+        while start < end:
+            windows.append(
+                {
+                    "market": market.id,
+                    "timeframe": timeframe,
+                    "start_time": start,
+                    "end_time": min(start + step, end),
+                }
+            )
+            start += step
+
+        PriceBackfill.insert_many(windows).on_conflict_ignore().execute()
+
+        return PriceBackfill.get_pending(market, timeframe)
+
+    def backfill_ohlcv(self, market, timeframe, windows):
+        from sliver.exchanges.factory import ExchangeFactory
+
+        info(f"backfilling {len(windows)} windows from {windows[0].start_time}")
+
+        # a window is fetched with a pooled client no other thread is using, as
+        # ccxt clients and their sessions aren't safe to share between threads
+        clients = queue.Queue()
+        for slot in range(min(self.backfill_workers, len(windows))):
+            exchange = type(self)(**self.__data__)
+            clients.put(ExchangeFactory.connect(exchange, slot=slot))
+
+        def fetch(window):
+            exchange = clients.get()
+            try:
+                exchange.fetch_ohlcv_window(market, timeframe, window)
+            finally:
+                clients.put(exchange)
+
+        with concurrent.futures.ThreadPoolExecutor(self.backfill_workers) as executor:
+            futures = [executor.submit(fetch, window) for window in windows]
+            try:
+                for future in concurrent.futures.as_completed(futures):
+                    future.result()
+            except BaseException:
+                executor.shutdown(cancel_futures=True)
+                raise
+
+        PriceBackfill.delete().where(PriceBackfill.market == market).where(
+            PriceBackfill.timeframe == timeframe
+        ).execute()
+
+        info("backfill is complete")
+
+    def fetch_ohlcv_window(self, market, timeframe, window):
+        # runs in a backfill thread, which uses a database connection of its own
+        tf_delta = get_timeframe_delta(timeframe)
+
+        prices = PriceBuffer(int((window.end_time - window.start_time) / tf_delta))
+        page_start = window.start_time
+
+        try:
+            while page_start < window.end_time:
+                page = self.api_fetch_ohlcv(
+                    market.get_symbol(), timeframe, since=page_start
+                )
+                if page is None or page.empty:
+                    # the exchange has candles after the window, so it's left
+                    # pending to be fetched again rather than saved with a gap
+                    raise PostponingError(
+                        f"no prices from {page_start} in backfill window "
+                        f"{window.start_time} to {window.end_time}"
+                    )
+
+                page = page[page.time < window.end_time]
+                if page.empty:
+                    # the next candle is past the window, there's nothing to fill
+                    break
+
+                prices.append(page)
+                page_start = page.iloc[-1].time + tf_delta
+
+            with db.connection.atomic():
+                self.save_ohlcv(market, timeframe, prices)
+                window.done = True
+                window.save()
+
+            info(f"received prices from {window.start_time} to {window.end_time}")
+
+        finally:
+            db.connection.close()
+
     def create_order(self, position, type, side, amount, price):
         market = position.user_strategy.strategy.market
 
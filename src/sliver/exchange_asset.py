@@ -1,8 +1,7 @@
-from decimal import Decimal as D
-
 import peewee
 
 import sliver.database as db
+import sliver.money as money
 from sliver.asset import Asset
 from sliver.exchange import Exchange
 
@@ -16,33 +15,25 @@ class ExchangeAsset(db.BaseModel):
         if prec is None:
             prec = self.precision
 
-        div = int(D(str(num)) / D(str(den)) * 10**prec)
+        div = money.div(num, den, prec)
 
         if prec == self.precision:
             return div
         else:
-            return self.transform(div, prec=(self.precision - prec))
+            return money.rescale(div, prec, self.precision)
 
     def format(self, value, prec=None):
-        if not value:
-            return 0
+        return money.to_decimal(value, self.precision, prec)
+
+    def transform(self, value, prec=None):
         if prec is None:
             prec = self.precision
-        precision = D("10") ** D(str(-1 * self.precision))
-        value = D(str(value)) * precision
-        if prec == self.precision:
-            return value.quantize(precision)
-        else:
-            trunc_precision = D("10") ** D(str(-1 * prec))
-            return value.quantize(trunc_precision)
+        return money.scale(value, prec)
 
-    def transform(self, value, prec=None):
-        if not value:
-            return 0
+    def transform_array(self, values, prec=None):
         if prec is None:
             prec = self.precision
-        precision = D("10") ** D(str(prec))
-        return int(D(str(value)) * precision)
+        return money.scale_array(values, prec)
 
     def print(self, value):
         value = self.format(value)
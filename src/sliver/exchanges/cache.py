@@ -0,0 +1,63 @@
+import threading
+import time
+
+from sliver.config import Config
+
+
+class TickerCache:
+    # last tickers keyed by exchange id and symbol, kept for TICKER_CACHE_TTL
+    # seconds; shared by all workers once the watchdog calls share()
+    tickers = {}
+    lock = threading.Lock()
+
+    @classmethod
+    def share(cls, manager):
+        cls.tickers = manager.dict()
+        cls.lock = manager.Lock()
+
+    @classmethod
+    def get(cls, key, symbol):
+        try:
+            fetched_at, ticker = cls.tickers[(key, symbol)]
+        except KeyError:
+            return None
+
+        if time.time() - fetched_at > float(Config().TICKER_CACHE_TTL):
+            return None
+
+        return ticker
+
+    @classmethod
+    def set(cls, key, symbol, ticker):
+        with cls.lock:
+            cls.tickers[(key, symbol)] = (time.time(), ticker)
+
+
+class BalanceCache:
+    # time of the last balance sync keyed by exchange id and user id, valid for
+    # BALANCE_CACHE_TTL seconds or until one of the user's orders gets filled
+    synced = {}
+    lock = threading.Lock()
+
+    @classmethod
+    def share(cls, manager):
+        cls.synced = manager.dict()
+        cls.lock = manager.Lock()
+
+    @classmethod
+    def is_fresh(cls, key, user_id):
+        synced_at = cls.synced.get((key, user_id))
+        if synced_at is None:
+            return False
+
+        return time.time() - synced_at <= float(Config().BALANCE_CACHE_TTL)
+
+    @classmethod
+    def set(cls, key, user_id):
+        with cls.lock:
+            cls.synced[(key, user_id)] = time.time()
+
+    @classmethod
+    def invalidate(cls, key, user_id):
+        with cls.lock:
+            cls.synced.pop((key, user_id), None)
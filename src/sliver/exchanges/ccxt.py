@@ -1,17 +1,19 @@
 import datetime
-import random
 import time
 from logging import info
 
 import ccxt
 import pandas
 
+import sliver.database as db
 from sliver.asset import Asset
 from sliver.balance import Balance
 from sliver.config import Config
 from sliver.exceptions import AuthenticationError, DisablingError, PostponingError
 from sliver.exchange import Exchange
 from sliver.exchange_asset import ExchangeAsset
+from sliver.exchanges.cache import BalanceCache, TickerCache
+from sliver.exchanges.limiter import RateLimiter
 from sliver.order import Order
 
 
@@ -29,6 +31,7 @@ class CCXT(Exchange):
 
         ccxt_class = getattr(ccxt, self.name)
         self._api = ccxt_class(api_key)
+        self._api.throttle = self.throttle
 
         try:
             sandbox_mode = Config().ENV_NAME == "development"
@@ -38,23 +41,22 @@ class CCXT(Exchange):
 
         self.check_latency()
 
+    def throttle(self, cost=None):
+        # replaces ccxt's per instance throttling, called with the request weight
+        cost = 1 if cost is None else cost
+        RateLimiter.acquire(self.id, self.rate_limit, cost)
+
     def api_call(call):
         def inner(self, *args, **kwargs):
             try:
-                # TODO proper multiprocess rate limiting
-                time.sleep(random.random() / 2)
-
                 return call(self, *args, **kwargs)
 
             except ccxt.BadSymbol:
                 pass
 
             except ccxt.RateLimitExceeded:
-                sleep_time = 60
-                if self.rate_limit:
-                    sleep_time = self.rate_limit
-                info(f"rate limited, sleeping for {sleep_time} seconds")
-                time.sleep(sleep_time)
+                info("rate limited, backing off")
+                RateLimiter.penalize(self.id, self.rate_limit)
                 return inner(self, *args, **kwargs)
 
             except ccxt.RequestTimeout:
@@ -86,7 +88,25 @@ class CCXT(Exchange):
 
     @api_call
     def api_fetch_ticker(self, symbol):
-        return self._api.fetch_ticker(symbol)
+        ticker = TickerCache.get(self.id, symbol)
+
+        if ticker is None:
+            ticker = self._api.fetch_ticker(symbol)
+            TickerCache.set(self.id, symbol, ticker)
+
+        return ticker
+
+    @api_call
+    def api_fetch_tickers(self, symbols):
+        if self._api.has["fetchTickers"]:
+            tickers = self._api.fetch_tickers(symbols)
+        else:
+            tickers = {symbol: self._api.fetch_ticker(symbol) for symbol in symbols}
+
+        for symbol, ticker in tickers.items():
+            TickerCache.set(self.id, symbol, ticker)
+
+        return tickers
 
     @api_call
     def api_fetch_last_price(self, symbol):
@@ -205,6 +225,8 @@ class CCXT(Exchange):
         if order is None or order.position_id != position.id:
             order = Order()
 
+        last_sync = (order.status, order.filled)
+
         ex_order = self.api_fetch_orders(market.get_symbol(), oid=oid)
 
         order.position = position
@@ -263,27 +285,80 @@ class CCXT(Exchange):
 
         order.save()
 
+        # fills, partial ones included, and cancels move the user's balance, so
+        # drop the snapshot
+        status, filled = last_sync
+        closed = order.status != "open" and order.status != status
+        if order.filled != filled or closed:
+            BalanceCache.invalidate(self.id, position.user_strategy.user_id)
+
         return order
 
     def sync_user_balance(self, user):
+        if BalanceCache.is_fresh(self.id, user.id):
+            return
+
         info(f"syncing user balance in exchange {self.name}")
 
         ex_bal = self.api_fetch_balance()
+        totals = {ticker.upper(): total for ticker, total in ex_bal["total"].items()}
+
+        with db.connection.atomic():
+            assets = self.get_synced_assets(totals.keys())
 
-        for ticker in ex_bal["total"]:
-            total = ex_bal["total"][ticker]
+            balances = {
+                bal.asset_id: bal.total
+                for bal in Balance.select().where(
+                    Balance.user == user,
+                    Balance.asset << [ex_asset.id for ex_asset in assets.values()],
+                )
+            }
 
-            asset, new = Asset.get_or_create(ticker=ticker.upper())
-            if new:
+            # only write back balances that are new or have changed
+            rows = []
+            for ticker, total in totals.items():
+                ex_asset = assets[ticker]
+                total = ex_asset.transform(total)
+                if ex_asset.id not in balances or balances[ex_asset.id] != total:
+                    rows.append({"user": user.id, "asset": ex_asset.id, "total": total})
+
+            if rows:
+                Balance.insert_many(rows).on_conflict(
+                    conflict_target=[Balance.asset, Balance.user],
+                    preserve=[Balance.total],
+                ).execute()
+                info(f"updated {len(rows)} balances")
+
+        BalanceCache.set(self.id, user.id)
+
+    def get_synced_assets(self, tickers):
+        # returns exchange assets by ticker, saving the ones not seen before
+        tickers = list(tickers)
+
+        assets = {
+            asset.ticker: asset
+            for asset in Asset.select().where(Asset.ticker << tickers)
+        }
+        new = [ticker for ticker in tickers if ticker not in assets]
+        if new:
+            Asset.insert_many([{"ticker": ticker} for ticker in new]).execute()
+            for asset in Asset.select().where(Asset.ticker << new):
                 info(f"saved new asset {asset.ticker}")
+                assets[asset.ticker] = asset
 
-            ex_asset, new = ExchangeAsset.get_or_create(exchange=self, asset=asset)
-            if new:
+        query = (
+            ExchangeAsset.select(ExchangeAsset, Asset)
+            .join(Asset)
+            .where(ExchangeAsset.exchange == self, Asset.ticker << tickers)
+        )
+        ex_assets = {ex_asset.asset.ticker: ex_asset for ex_asset in query}
+        new = [assets[ticker] for ticker in tickers if ticker not in ex_assets]
+        if new:
+            ExchangeAsset.insert_many(
+                [{"exchange": self.id, "asset": asset.id} for asset in new]
+            ).execute()
+            for ex_asset in query.where(Asset.id << [asset.id for asset in new]):
                 info(f"saved asset {ex_asset.asset.ticker}")
+                ex_assets[ex_asset.asset.ticker] = ex_asset
 
-            u_bal, new = Balance.get_or_create(user=user, asset=ex_asset)
-            if new:
-                info(f"saved new balance {u_bal.id}")
-
-            u_bal.total = ex_asset.transform(total)
-            u_bal.save()
+        return ex_assets
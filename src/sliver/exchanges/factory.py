@@ -1,3 +1,5 @@
+import time
+
 from sliver.exceptions import DisablingError
 from sliver.exchanges.ccxt import CCXT
 from sliver.exchanges.mt5 import MT5
@@ -5,6 +7,13 @@ from sliver.exchanges.types import ExchangeTypes
 
 
 class ExchangeFactory:
+    # process-local pool of api clients, so that a client and its loaded markets
+    # are reused across tasks; latency is probed every probe_interval seconds
+    # instead of on every connection, and idle clients are dropped
+    clients = {}
+    idle_timeout = 900
+    probe_interval = 60
+
     @classmethod
     def from_base(self, exchange):
         if exchange.type == ExchangeTypes.CCXT:
@@ -18,12 +27,54 @@ class ExchangeFactory:
 
         return exchange
 
+    @classmethod
+    def from_ids(self, ids):
+        # loads many exchanges at once, with a single query per exchange type
+        exchanges = {}
+
+        for type, model in [(ExchangeTypes.CCXT, CCXT), (ExchangeTypes.MT5, MT5)]:
+            query = model.select().where(model.id << list(ids), model.type == type)
+            exchanges.update({exchange.id: exchange for exchange in query})
+
+        return exchanges
+
     @classmethod
     def from_credential(self, credential):
         exchange = credential.exchange
 
         exchange = self.from_base(exchange)
 
-        exchange.api = credential
+        return self.connect(exchange, credential)
+
+    @classmethod
+    def connect(self, exchange, credential=None, slot=None):
+        now = time.time()
+
+        for key, (api, used, probed) in list(self.clients.items()):
+            if now - used > self.idle_timeout:
+                del self.clients[key]
+
+        key = (exchange.id, None)
+        if credential:
+            key = (exchange.id, credential.id, credential.api_key)
+        if slot is not None:
+            # clients of their own for threads using the exchange concurrently
+            key += ("slot", slot)
+
+        try:
+            api, used, probed = self.clients[key]
+        except KeyError:
+            # the setter builds the client and checks its latency
+            exchange.api = credential
+            self.clients[key] = (exchange.api, now, now)
+            return exchange
+
+        exchange._api = api
+
+        if now - probed > self.probe_interval:
+            exchange.check_latency()
+            probed = now
+
+        self.clients[key] = (api, now, probed)
 
         return exchange
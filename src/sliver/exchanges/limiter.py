@@ -0,0 +1,42 @@
+import threading
+import time
+
+
+class RateLimiter:
+    # token buckets keyed by exchange id, refilled at rate_limit weight per
+    # minute; they are process-local until share() swaps them for proxies of a
+    # multiprocessing manager, which the watchdog does before forking workers
+    buckets = {}
+    lock = threading.Lock()
+
+    @classmethod
+    def share(cls, manager):
+        cls.buckets = manager.dict()
+        cls.lock = manager.Lock()
+
+    @classmethod
+    def acquire(cls, key, rate_limit, cost=1):
+        if not rate_limit:
+            return
+
+        rate = rate_limit / 60
+        now = time.time()
+
+        # tokens may go negative: callers reserve their share and sleep it off
+        # outside of the lock, so concurrent callers queue up fairly
+        with cls.lock:
+            tokens, last = cls.buckets.get(key, (rate_limit, now))
+            tokens = min(rate_limit, tokens + (now - last) * rate) - cost
+            cls.buckets[key] = (tokens, now)
+
+        if tokens < 0:
+            time.sleep(-tokens / rate)
+
+    @classmethod
+    def penalize(cls, key, rate_limit):
+        # the exchange disagrees with our accounting, back off a whole window
+        if not rate_limit:
+            return
+
+        with cls.lock:
+            cls.buckets[key] = (-rate_limit, time.time())
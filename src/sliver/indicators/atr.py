@@ -1,3 +1,27 @@
+import pandas
+
+
+def RMA(series, length, last=None):
+    # https://www.tradingview.com/pine-script-reference/v5/#fun_ta{dot}rma
+    # wilder's average is an ewm with alpha 1 / length seeded with the simple
+    # average of the first length values, or continuing from the last average
+    if last is None:
+        if len(series) < length:
+            return series * float("nan")
+
+        values = series.iloc[length - 1 :].astype("float64")
+        values.iloc[0] = series.iloc[:length].mean()
+    else:
+        values = pandas.concat([pandas.Series([last], dtype="float64"), series])
+
+    rma = values.ewm(alpha=1 / length, adjust=False).mean()
+
+    if last is not None:
+        rma = rma.iloc[1:]
+
+    return rma.reindex(series.index)
+
+
 def ATR(ohlc, length=14, smoothing="sma"):
     df = ohlc.copy()
 
@@ -8,12 +32,7 @@ def ATR(ohlc, length=14, smoothing="sma"):
     df["tr"] = df[["tr0", "tr1", "tr2"]].max(axis=1)
 
     if smoothing == "rma":
-        # https://www.tradingview.com/pine-script-reference/v5/#fun_ta{dot}rma
-        alpha = 1 / length
-        first = df.tr.loc[: length - 1].mean()
-        df.loc[length - 1, "atr"] = first
-        for idx, row in df.loc[length:].iterrows():
-            df.loc[idx, "atr"] = alpha * row.tr + (1 - alpha) * df.atr.loc[idx - 1]
+        df["atr"] = RMA(df.tr, length)
 
     elif smoothing == "ema":
         df["atr"] = df.tr.ewm(span=length).mean()
@@ -1,40 +1,47 @@
+import numpy
 import pandas
-import decimal
 
 from sliver.utils import get_timeframe_freq
 
 
-def get_mean_var(
-    series: pandas.DataFrame,
-    n: int,
-    old_mean: decimal.Decimal,
-    old_var: decimal.Decimal,
-):
-    # https://math.stackexchange.com/questions/102978/incremental-computation-of-standard-deviation
-    n = decimal.Decimal(str(n))
-    for i, x in series.items():
-        try:
-            x = decimal.Decimal(str(x))
-        except decimal.InvalidOperation:
-            x = 0
+def get_moments(values):
+    # (n, mean, M2) of the values, M2 being the sum of squared deviations;
+    # values that are not numbers count as zero
+    values = pandas.to_numeric(pandas.Series(values), errors="coerce")
+    values = values.fillna(0).to_numpy(dtype="float64")
 
-        n += 1
+    if not values.size:
+        return 0, 0.0, 0.0
 
-        new_mean = (old_mean * (n - 1) + x) / n
+    mean = values.mean()
 
-        if n == 1:
-            new_var = 0
-        else:
-            new_var = (
-                (n - 2) * old_var
-                + (n - 1) * (old_mean - new_mean) ** 2
-                + (x - new_mean) ** 2
-            ) / (n - 1)
+    return values.size, mean, ((values - mean) ** 2).sum()
 
-        old_var = new_var
-        old_mean = new_mean
 
-    return new_mean, new_var
+def combine_moments(a, b):
+    # https://en.wikipedia.org/wiki/Algorithms_for_calculating_variance#Parallel_algorithm
+    n_a, mean_a, m2_a = a
+    n_b, mean_b, m2_b = b
+
+    n = n_a + n_b
+    if n == 0:
+        return 0, 0.0, 0.0
+
+    delta = mean_b - mean_a
+    mean = mean_a + delta * n_b / n
+    m2 = m2_a + m2_b + delta**2 * n_a * n_b / n
+
+    return n, mean, m2
+
+
+def get_mean_var(series, n, old_mean, old_var):
+    # combines the stored sample mean and variance of n values with the series
+    n = int(n)
+    old = (n, float(old_mean), float(old_var) * (n - 1) if n > 1 else 0.0)
+
+    n, mean, m2 = combine_moments(old, get_moments(series))
+
+    return mean, m2 / (n - 1) if n > 1 else 0.0
 
 
 def HYPNOX(ohlc, tweets, timeframe="1h", n_samples=0, mean=0, variance=0):
@@ -47,14 +54,15 @@ def HYPNOX(ohlc, tweets, timeframe="1h", n_samples=0, mean=0, variance=0):
         indicators["n_samples"] = n_samples
         indicators["mean"] = mean
         indicators["variance"] = variance
-        return indicators
+        return indicators.reset_index()
 
     # compute new metrics
     mean, variance = get_mean_var(tweets.score, n_samples, mean, variance)
 
     # apply normalization
     tweets = tweets.set_index("time")
-    tweets["z_score"] = (tweets.score - mean) / variance.sqrt()
+    score = pandas.to_numeric(tweets.score, errors="coerce").fillna(0)
+    tweets["z_score"] = (score - mean) / numpy.sqrt(variance)
 
     # resample tweets by strat timeframe freq median
     freq = get_timeframe_freq(timeframe)
@@ -1,30 +1,100 @@
-import pylunar
-
-
-def period(moon, time):
-    moon.update(time)
-    nm_sec = moon.time_to_new_moon() * 60 * 60
-    if nm_sec - 1031220 <= 0 and nm_sec - 564020 > 0:
-        # green
-        return 1
-    if nm_sec - 564020 <= 0 and nm_sec - 298620 > 0:
-        # black
-        return 2
-    if nm_sec - 298620 <= 0 and nm_sec - 298620 + 612000 > 0:
-        # green
-        return 1
-    if nm_sec - 1819620 <= 0 and nm_sec - 1531920 >= 0:
-        # yellow
-        return -1
-    # red is remainder
-    return 0
+import datetime
+import os
+import tempfile
+
+import ephem
+import numpy
+import pandas
+
+from sliver.config import Config
+
+# new moon instants are computed once for at least this range, and kept in
+# ETC_DIR so later runs only load them
+NEW_MOONS_SINCE = datetime.datetime(2000, 1, 1)
+NEW_MOONS_UNTIL = datetime.datetime(2050, 1, 1)
+
+new_moons = None
+
+
+def compute_new_moons(since, until):
+    moons = []
+    date = ephem.Date(since)
+    while not moons or moons[-1] <= until:
+        date = ephem.next_new_moon(date)
+        moons.append(date.datetime())
+
+    return numpy.array(moons, dtype="datetime64[ns]")
+
+
+def get_new_moons(since, until):
+    # sorted new moon instants from before since to after until
+    global new_moons
+
+    path = os.path.join(Config().ETC_DIR, "new_moons.npy")
+
+    if new_moons is None and os.path.exists(path):
+        new_moons = numpy.load(path)
+
+    if (
+        new_moons is None
+        or new_moons[0] > numpy.datetime64(since)
+        or new_moons[-1] <= numpy.datetime64(until)
+    ):
+        since = min(since, NEW_MOONS_SINCE)
+        until = max(until, NEW_MOONS_UNTIL)
+        if new_moons is not None:
+            since = min(since, new_moons[0].astype("datetime64[us]").item())
+            until = max(until, new_moons[-1].astype("datetime64[us]").item())
+
+        new_moons = compute_new_moons(since - datetime.timedelta(days=30), until)
+
+        # other workers may be loading the cache, so it's replaced at once
+        fd, tmp_path = tempfile.mkstemp(dir=Config().ETC_DIR, suffix=".npy")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                numpy.save(f, new_moons)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    return new_moons
+
+
+def get_periods(times):
+    times = pandas.to_datetime(pandas.Series(times)).to_numpy(dtype="datetime64[ns]")
+    if not times.size:
+        return numpy.array([], dtype="int64")
+
+    moons = get_new_moons(
+        pandas.Timestamp(times.min()).to_pydatetime(),
+        pandas.Timestamp(times.max()).to_pydatetime(),
+    )
+
+    # seconds to the next new moon
+    next_moons = moons[numpy.searchsorted(moons, times, side="right")]
+    nm_sec = (next_moons - times) / numpy.timedelta64(1, "s")
+
+    return numpy.select(
+        [
+            # green
+            (nm_sec - 1031220 <= 0) & (nm_sec - 564020 > 0),
+            # black
+            (nm_sec - 564020 <= 0) & (nm_sec - 298620 > 0),
+            # green
+            (nm_sec - 298620 <= 0) & (nm_sec - 298620 + 612000 > 0),
+            # yellow
+            (nm_sec - 1819620 <= 0) & (nm_sec - 1531920 >= 0),
+        ],
+        [1, 2, 1, -1],
+        # red is remainder
+        default=0,
+    )
 
 
 def MOON(ohlc):
     df = ohlc.copy()
 
-    moon = pylunar.MoonInfo((28, 2, 4.9), (86, 55, 0.9))
-
-    df["moon_phase"] = df["time"].apply(lambda x: period(moon, x))
+    df["moon_phase"] = get_periods(df["time"])
 
     return df
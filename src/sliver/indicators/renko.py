@@ -5,6 +5,113 @@ import pandas
 from sliver.exceptions import DisablingError
 
 
+class Renko:
+    # streaming brick builder, fed one close at a time: it keeps the last brick
+    # and the lowest and highest closes since it, for the wicks of the next one,
+    # so each candle costs O(1) and a saved state resumes with new candles only
+
+    def __init__(self, first, size=None, last=None, low=math.inf, high=-math.inf):
+        self.first = first
+        self.size = size
+        # open and close of the last brick, none until the first ones
+        self.last = last
+        self.low = low
+        self.high = high
+
+    def get_state(self):
+        return {
+            "first": self.first,
+            "size": self.size,
+            "last": self.last,
+            "low": self.low,
+            "high": self.high,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(**state)
+
+    def update(self, time, close, size=None):
+        # returns the bricks closed by this candle, if any
+        if close < self.low:
+            self.low = close
+        if close > self.high:
+            self.high = close
+
+        if size is None:
+            size = self.size
+
+        if not size:
+            return []
+
+        if self.last is None:
+            # first bricks
+            start = self.first
+            if close > start + 2 * size:
+                up, wick = True, self.low
+            elif close < start - 2 * size:
+                up, wick = False, self.high
+            else:
+                return []
+        else:
+            top = max(self.last)
+            bottom = min(self.last)
+            if top == bottom:
+                return []
+
+            if close > top + size:
+                start = top
+                up = True
+                wick = self.low if self.low < start - size else start
+            elif close < bottom - size:
+                start = bottom
+                up = False
+                wick = self.high if self.high > start + size else start
+            else:
+                return []
+
+        if up:
+            steps = math.floor((close - start) / size)
+            bricks = [
+                {
+                    "time": time,
+                    "open": start + (mult * size),
+                    "high": start + ((mult + 1) * size),
+                    "low": wick if mult == 0 else start + (mult * size),
+                    "close": start + ((mult + 1) * size),
+                }
+                for mult in range(0, steps)
+            ]
+        else:
+            steps = math.floor((start - close) / size)
+            bricks = [
+                {
+                    "time": time,
+                    "open": start - (mult * size),
+                    "high": wick if mult == 0 else start - (mult * size),
+                    "low": start - ((mult + 1) * size),
+                    "close": start - ((mult + 1) * size),
+                }
+                for mult in range(0, steps)
+            ]
+
+        self.last = (bricks[-1]["open"], bricks[-1]["close"])
+        self.low = math.inf
+        self.high = -math.inf
+
+        return bricks
+
+    def update_many(self, times, closes, sizes=None):
+        if sizes is None:
+            sizes = [None] * len(closes)
+
+        bricks = []
+        for time, close, size in zip(times, closes, sizes):
+            bricks += self.update(time, close, size)
+
+        return bricks
+
+
 def RENKO(ohlc, size=10, use_atr=False):
     if use_atr:
         assert "atr" in ohlc.columns
@@ -18,140 +125,11 @@ def RENKO(ohlc, size=10, use_atr=False):
     if first == 0:
         first = size
 
-    bricks = []
-
-    for idx, row in ohlc.iterrows():
-        price = row.close
-        time = row.time
-
-        if use_atr:
-            size = row.atr
-
-        if not size:
-            continue
-
-        # first bricks
-        if len(bricks) == 0:
-            if price > first + 2 * size:
-                # green
-                steps = math.floor((price - first) / size)
-                next_bricks = [
-                    {
-                        "time": time,
-                        "open": first + (mult * size),
-                        "high": first + ((mult + 1) * size),
-                        "low": ohlc.loc[ohlc.index <= idx].close.min()
-                        if mult == 0
-                        else first + (mult * size),
-                        "close": first + ((mult + 1) * size),
-                    }
-                    for mult in range(0, steps)
-                ]
-                bricks += next_bricks
-                curr = next_bricks[-1]
-            elif price < first - 2 * size:
-                # red
-                steps = math.floor((first - price) / size)
-                next_bricks = [
-                    {
-                        "time": time,
-                        "open": first - (mult * size),
-                        "high": ohlc.loc[ohlc.index <= idx].close.max()
-                        if mult == 0
-                        else first - (mult * size),
-                        "low": first - ((mult + 1) * size),
-                        "close": first - ((mult + 1) * size),
-                    }
-                    for mult in range(0, steps)
-                ]
-                bricks += next_bricks
-                curr = next_bricks[-1]
-            continue
-
-        if curr["close"] > curr["open"]:
-            # uptrend
-            if price > curr["close"] + size:
-                # green
-                in_between = ohlc.loc[
-                    (ohlc.time > bricks[-1]["time"]) & (ohlc.index <= idx)
-                ]
-                steps = math.floor((price - curr["close"]) / size)
-                next_bricks = [
-                    {
-                        "time": time,
-                        "open": curr["close"] + (mult * size),
-                        "high": curr["close"] + ((mult + 1) * size),
-                        "low": in_between.close.min()
-                        if mult == 0 and in_between.close.min() < curr["close"] - size
-                        else curr["close"] + (mult * size),
-                        "close": curr["close"] + ((mult + 1) * size),
-                    }
-                    for mult in range(0, steps)
-                ]
-                bricks += next_bricks
-                curr = next_bricks[-1]
-            elif price < curr["open"] - size:
-                # red
-                in_between = ohlc.loc[
-                    (ohlc.time > bricks[-1]["time"]) & (ohlc.index <= idx)
-                ]
-                steps = math.floor((curr["open"] - price) / size)
-                next_bricks = [
-                    {
-                        "time": time,
-                        "open": curr["open"] - (mult * size),
-                        "high": in_between.close.max()
-                        if mult == 0 and in_between.close.max() > curr["open"] + size
-                        else curr["open"] - (mult * size),
-                        "low": curr["open"] - ((mult + 1) * size),
-                        "close": curr["open"] - ((mult + 1) * size),
-                    }
-                    for mult in range(0, steps)
-                ]
-                bricks += next_bricks
-                curr = next_bricks[-1]
-
-        elif curr["open"] > curr["close"]:
-            # downtrend
-            if price > curr["open"] + size:
-                # green
-                in_between = ohlc.loc[
-                    (ohlc.time > bricks[-1]["time"]) & (ohlc.index <= idx)
-                ]
-                steps = math.floor((price - curr["open"]) / size)
-                next_bricks = [
-                    {
-                        "time": time,
-                        "open": curr["open"] + (mult * size),
-                        "high": curr["open"] + ((mult + 1) * size),
-                        "low": in_between.close.min()
-                        if mult == 0 and in_between.close.min() < curr["open"] - size
-                        else curr["open"] + (mult * size),
-                        "close": curr["open"] + ((mult + 1) * size),
-                    }
-                    for mult in range(0, steps)
-                ]
-                bricks += next_bricks
-                curr = next_bricks[-1]
-            elif price < curr["close"] - size:
-                # red
-                in_between = ohlc.loc[
-                    (ohlc.time > bricks[-1]["time"]) & (ohlc.index <= idx)
-                ]
-                steps = math.floor((curr["close"] - price) / size)
-                next_bricks = [
-                    {
-                        "time": time,
-                        "open": curr["close"] - (mult * size),
-                        "high": in_between.close.max()
-                        if mult == 0 and in_between.close.max() > curr["close"] + size
-                        else curr["close"] - (mult * size),
-                        "low": curr["close"] - ((mult + 1) * size),
-                        "close": curr["close"] - ((mult + 1) * size),
-                    }
-                    for mult in range(0, steps)
-                ]
-                bricks += next_bricks
-                curr = next_bricks[-1]
+    renko = Renko(first, size)
+    bricks = renko.update_many(
+        ohlc.time.tolist(),
+        ohlc.close.tolist(),
+        ohlc.atr.tolist() if use_atr else None,
+    )
 
     return pandas.DataFrame(bricks)
@@ -0,0 +1,327 @@
+import collections
+import math
+from abc import ABC, abstractmethod
+
+import numpy
+
+# streaming versions of the batch indicators: each keeps the compact state it
+# needs (windows of the last values, running sums, ewm accumulators) so a new
+# candle costs O(1), and get_state/from_state turn that state into plain json
+# values to resume with the next candles only
+
+streams = {}
+
+
+class Stream(ABC):
+    # indicator over a single series, fed one value at a time
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        streams[cls.__name__] = cls
+
+    @abstractmethod
+    def update(self, value):
+        ...
+
+    def update_many(self, values):
+        return numpy.array([self.update(v) for v in values], dtype="float64")
+
+    def get_state(self):
+        state = {}
+        for key, value in vars(self).items():
+            if isinstance(value, Stream):
+                value = value.get_state()
+            elif isinstance(value, collections.deque):
+                value = list(value)
+            state[key] = value
+
+        return {"type": type(self).__name__, "state": state}
+
+    @staticmethod
+    def from_state(state):
+        stream = streams[state["type"]].__new__(streams[state["type"]])
+        for key, value in state["state"].items():
+            if isinstance(value, dict) and "type" in value:
+                value = Stream.from_state(value)
+            elif isinstance(value, list):
+                value = collections.deque(value)
+            setattr(stream, key, value)
+
+        return stream
+
+
+class CandleStream(Stream):
+    # indicator over candles, fed a mapping with open, high, low and close
+    fields = ()
+
+    def update_many(self, candles):
+        columns = {k: list(v) for k, v in candles.items()}
+        size = len(next(iter(columns.values()), []))
+
+        values = {f: numpy.empty(size, dtype="float64") for f in self.fields}
+        for i in range(size):
+            out = self.update({k: v[i] for k, v in columns.items()})
+            for f in self.fields:
+                values[f][i] = out[f]
+
+        return values
+
+
+def is_nan(value):
+    return value is None or value != value
+
+
+class SMA(Stream):
+    # rolling(length).mean(), with a compensated running sum of the window
+    def __init__(self, length):
+        self.length = length
+        self.window = collections.deque()
+        self.total = 0.0
+        self.compensation = 0.0
+        self.nans = 0
+
+    def add(self, value):
+        # neumaier summation
+        total = self.total + value
+        if abs(self.total) >= abs(value):
+            self.compensation += (self.total - total) + value
+        else:
+            self.compensation += (value - total) + self.total
+        self.total = total
+
+    def update(self, value):
+        if is_nan(value):
+            self.nans += 1
+            value = math.nan
+        else:
+            self.add(value)
+        self.window.append(value)
+
+        if len(self.window) > self.length:
+            old = self.window.popleft()
+            if is_nan(old):
+                self.nans -= 1
+            else:
+                self.add(-old)
+
+        if len(self.window) < self.length or self.nans:
+            return math.nan
+
+        return (self.total + self.compensation) / self.length
+
+
+class STD(Stream):
+    # rolling(length).std(ddof), adding and removing values from the window
+    # with welford's updates, around the first value to keep their precision;
+    # non-finite values are kept out of the sums, and as with rolling there's
+    # no value while the window holds any of them
+    def __init__(self, length, ddof=1):
+        self.length = length
+        self.ddof = ddof
+        self.window = collections.deque()
+        self.shift = None
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.nans = 0
+
+    def update(self, value):
+        if is_nan(value) or math.isinf(value):
+            self.nans += 1
+            value = math.nan
+        else:
+            if self.shift is None:
+                self.shift = value
+            value -= self.shift
+
+            self.n += 1
+            delta = value - self.mean
+            self.mean += delta / self.n
+            self.m2 += delta * (value - self.mean)
+        self.window.append(value)
+
+        if len(self.window) > self.length:
+            old = self.window.popleft()
+            if is_nan(old):
+                self.nans -= 1
+            elif self.n > 1:
+                self.n -= 1
+                delta = old - self.mean
+                self.mean -= delta / self.n
+                self.m2 -= delta * (old - self.mean)
+            else:
+                self.n = 0
+                self.mean = 0.0
+                self.m2 = 0.0
+
+        if len(self.window) < self.length or self.nans or self.n <= self.ddof:
+            return math.nan
+
+        return math.sqrt(max(self.m2, 0.0) / (self.n - self.ddof))
+
+
+class EMA(Stream):
+    # ewm(span=, com= or alpha=, min_periods=, adjust=).mean() as pandas
+    # computes it, nans keep the last average
+    def __init__(self, span=None, com=None, alpha=None, min_periods=0, adjust=True):
+        if alpha is None:
+            alpha = 2 / (span + 1) if span is not None else 1 / (com + 1)
+        self.alpha = alpha
+        self.min_periods = max(min_periods, 1)
+        self.adjust = adjust
+        self.nobs = 0
+        self.average = math.nan
+        self.weight = 0.0
+
+    def update(self, value):
+        decay = 1 - self.alpha
+
+        if is_nan(value):
+            if self.nobs:
+                self.weight *= decay
+        elif not self.nobs:
+            self.average = value
+            self.weight = 1.0
+            self.nobs = 1
+        else:
+            new_weight = 1.0 if self.adjust else self.alpha
+            self.weight *= decay
+            self.average = (self.weight * self.average + new_weight * value) / (
+                self.weight + new_weight
+            )
+            self.weight = self.weight + new_weight if self.adjust else 1.0
+            self.nobs += 1
+
+        if self.nobs < self.min_periods:
+            return math.nan
+
+        return self.average
+
+
+class RMA(Stream):
+    # wilder's average, seeded with the simple average of the first length
+    # values, as indicators.atr.RMA
+    def __init__(self, length):
+        self.length = length
+        self.seed = SMA(length)
+        self.ewm = None
+
+    def get_alpha(self):
+        return 1 / self.length
+
+    def update(self, value):
+        if self.ewm is None:
+            seed = self.seed.update(value)
+            if is_nan(seed):
+                return math.nan
+            self.ewm = EMA(alpha=self.get_alpha(), adjust=False)
+            return self.ewm.update(seed)
+
+        return self.ewm.update(value)
+
+
+class SeededEMA(RMA):
+    # ewm(span=length, adjust=False) seeded with the simple average of the
+    # first length values, as pandas_ta's ema
+    def get_alpha(self):
+        return 2 / (self.length + 1)
+
+
+class BB(CandleStream):
+    # as indicators.bb.BB
+    fields = ("ma", "bolu", "bold")
+
+    def __init__(self, ma_period=20, num_std=2, use_ema=False):
+        self.num_std = num_std
+        self.ma = EMA(span=ma_period) if use_ema else SMA(ma_period)
+        self.std = STD(ma_period, ddof=0)
+
+    def update(self, candle):
+        tp = (candle["high"] + candle["low"] + candle["close"]) / 3
+        ma = self.ma.update(tp)
+        std = self.std.update(tp)
+
+        return {
+            "ma": ma,
+            "bolu": ma + self.num_std * std,
+            "bold": ma - self.num_std * std,
+        }
+
+
+class MACD(CandleStream):
+    # as indicators.macd.MACD
+    fields = ("macd", "macd_signal")
+
+    def __init__(self, fast=12, slow=26, signal=9, use_ema=True):
+        if use_ema:
+            self.fast = EMA(span=fast, min_periods=fast)
+            self.slow = EMA(span=slow, min_periods=slow)
+        else:
+            self.fast = SMA(fast)
+            self.slow = SMA(slow)
+        self.signal = EMA(span=signal, min_periods=signal)
+
+    def update(self, candle):
+        macd = self.fast.update(candle["close"]) - self.slow.update(candle["close"])
+
+        return {"macd": macd, "macd_signal": self.signal.update(macd)}
+
+
+class RSI(CandleStream):
+    # as indicators.rsi.RSI, which has no value for the first candle, or with
+    # ewm set as pandas_ta's rsi, averaging with ewm(alpha=1 / period)
+    fields = ("rsi",)
+
+    def __init__(self, period=14, scalar=100, ewm=False):
+        self.scalar = scalar
+        if ewm:
+            self.gains = EMA(alpha=1 / period, min_periods=period)
+            self.losses = EMA(alpha=1 / period, min_periods=period)
+        else:
+            self.gains = SMA(period)
+            self.losses = SMA(period)
+        self.close = None
+
+    def update(self, candle):
+        last, self.close = self.close, candle["close"]
+        if last is None:
+            return {"rsi": math.nan}
+
+        delta = self.close - last
+        gains = self.gains.update(delta if delta > 0 else 0)
+        losses = self.losses.update(-delta if delta < 0 else 0)
+
+        total = gains + abs(losses)
+        if total == 0:
+            return {"rsi": math.nan}
+
+        return {"rsi": self.scalar * gains / total}
+
+
+class ATR(CandleStream):
+    # as indicators.atr.ATR, with zeros until there are enough candles
+    fields = ("atr",)
+
+    def __init__(self, length=14, smoothing="sma"):
+        if smoothing == "rma":
+            self.average = RMA(length)
+        elif smoothing == "ema":
+            self.average = EMA(span=length)
+        elif smoothing == "sma":
+            self.average = SMA(length)
+        else:
+            raise ValueError("invalid smoothing method")
+        self.close = None
+
+    def update(self, candle):
+        ranges = [abs(candle["high"] - candle["low"])]
+        if self.close is not None:
+            ranges += [
+                abs(candle["high"] - self.close),
+                abs(self.close - candle["low"]),
+            ]
+        self.close = candle["close"]
+
+        atr = self.average.update(max(r for r in ranges if not is_nan(r)))
+
+        return {"atr": 0 if is_nan(atr) else atr}
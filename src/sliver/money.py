@@ -0,0 +1,168 @@
+from decimal import Decimal as D
+
+import numpy
+import pandas
+
+from sliver.exceptions import BaseError
+
+# fixed-point arithmetic over integers scaled by 10^prec, as stored in the
+# database; scalar functions follow the Decimal semantics of ExchangeAsset but
+# stay exact in integers, and the *_array versions work on whole int64 columns
+
+INT64_MAX = numpy.iinfo("int64").max
+
+
+def to_ratio(value):
+    # returns (n, e) such that value == n * 10^e, exactly
+    if isinstance(value, (int, numpy.integer)):
+        return int(value), 0
+
+    value = D(str(value))
+    exponent = value.as_tuple().exponent
+    if not isinstance(exponent, int):
+        raise ValueError(f"cannot convert {value} to fixed point")
+
+    return int(value.scaleb(-exponent)), exponent
+
+
+def shift(n, k):
+    # n * 10^k truncated towards zero
+    if k >= 0:
+        return n * 10**k
+
+    q = abs(n) // 10**-k
+    return q if n >= 0 else -q
+
+
+def round_half_even(n, k):
+    # n / 10^k rounded half to even
+    if k <= 0:
+        return n * 10**-k
+
+    q, r = divmod(n, 10**k)
+    if 2 * r > 10**k or (2 * r == 10**k and q % 2 == 1):
+        q += 1
+
+    return q
+
+
+def scale(value, prec):
+    # value as an integer scaled by 10^prec, truncated
+    if not value:
+        return 0
+
+    n, e = to_ratio(value)
+
+    return shift(n, e + prec)
+
+
+def rescale(value, from_prec, to_prec):
+    # scaled integer from 10^from_prec to 10^to_prec, truncated
+    return shift(int(value), to_prec - from_prec)
+
+
+def div(num, den, prec):
+    # num / den as an integer scaled by 10^prec, truncated
+    num, num_e = to_ratio(num)
+    den, den_e = to_ratio(den)
+
+    if den == 0:
+        raise ZeroDivisionError("fixed point division by zero")
+
+    k = num_e - den_e + prec
+    if k >= 0:
+        q = abs(num) * 10**k // abs(den)
+    else:
+        q = abs(num) // (abs(den) * 10**-k)
+
+    return q if (num >= 0) == (den > 0) else -q
+
+
+def to_decimal(value, prec, decimals=None):
+    # integer scaled by 10^prec as a Decimal with decimals places, rounded half
+    # to even like Decimal.quantize
+    if not value:
+        return 0
+
+    if decimals is None:
+        decimals = prec
+
+    n, e = to_ratio(value)
+
+    return D(round_half_even(n, prec - e - decimals)).scaleb(-decimals)
+
+
+def check_range(values):
+    if values.size and numpy.abs(values).max() >= INT64_MAX:
+        raise BaseError("fixed point value out of int64 range")
+
+
+def scale_array(values, prec):
+    # float array as int64 scaled by 10^prec, where nan counts as zero, equal to
+    # scale of each value: as long as the scaled floats are well below 2^53 the
+    # nearest integer is compared with the value to tell on which side of it
+    # the value's decimal lies, larger ones are scaled one at a time
+    values = numpy.nan_to_num(numpy.asarray(values, dtype="float64"))
+    scaled = numpy.abs(values) * 10.0**prec
+    nearest = numpy.rint(scaled)
+    check_range(nearest)
+
+    below = numpy.abs(values) < nearest / 10.0**prec
+    result = (numpy.sign(values) * (nearest - below)).astype("int64")
+
+    large = scaled >= 2**48
+    if large.any():
+        result[large] = [scale(float(v), prec) for v in values[large]]
+
+    return result
+
+
+def rescale_array(values, from_prec, to_prec):
+    values = numpy.asarray(values, dtype="int64")
+    k = to_prec - from_prec
+
+    if k >= 0:
+        if values.size and numpy.abs(values).max() > INT64_MAX // 10**k:
+            raise BaseError("fixed point value out of int64 range")
+        return values * 10**k
+
+    return numpy.sign(values) * (numpy.abs(values) // 10**-k)
+
+
+def div_array(num, den, prec):
+    num = numpy.asarray(num, dtype="int64")
+    den = numpy.asarray(den, dtype="int64")
+
+    if numpy.any(den == 0):
+        raise ZeroDivisionError("fixed point division by zero")
+
+    sign = numpy.sign(num) * numpy.sign(den)
+    num = numpy.abs(num)
+    den = numpy.abs(den)
+
+    if prec >= 0:
+        if num.size and num.max() > INT64_MAX // 10**prec:
+            raise BaseError("fixed point value out of int64 range")
+        return sign * (num * 10**prec // den)
+
+    return sign * (num // (den * 10**-prec))
+
+
+def render_array(values, prec, decimals):
+    # integers scaled by 10^prec as float64 rounded half to even at decimals
+    # places, for rendering; nulls are nan
+    values = pandas.Series(values)
+    null = values.isna().to_numpy()
+    ints = values.fillna(0).astype("int64").to_numpy()
+
+    if decimals >= prec:
+        rendered = ints / 10.0**prec
+    else:
+        k = 10 ** (prec - decimals)
+        q, r = numpy.divmod(ints, k)
+        q += (2 * r > k) | ((2 * r == k) & (q % 2 == 1))
+        rendered = q / 10.0**decimals
+
+    rendered[null] = numpy.nan
+
+    return rendered
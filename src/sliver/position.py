@@ -1,12 +1,17 @@
 import datetime
-from logging import info
+from decimal import Decimal as D
+from decimal import InvalidOperation
+from logging import exception, info
 
+import numpy
+import pandas
 import peewee
 
 import sliver.database as db
 from sliver.asset import Asset
 from sliver.credential import Credential
 from sliver.exceptions import DisablingError
+from sliver.exchange import Exchange
 from sliver.exchange_asset import ExchangeAsset
 from sliver.exchanges.factory import ExchangeFactory
 from sliver.market import Market
@@ -14,6 +19,8 @@ from sliver.order import Order
 from sliver.strategies.factory import StrategyFactory
 from sliver.strategies.status import StrategyStatus
 from sliver.strategy import BaseStrategy, StrategySignals
+from sliver.trade_engine import TradeEngine
+from sliver.user import User
 from sliver.user_strategy import UserStrategy
 from sliver.utils import get_next_refresh, get_return, get_roi
 
@@ -66,6 +73,135 @@ class Position(db.BaseModel):
     def get_opening(cls):
         return cls.get_idle().where(cls.status << ["open", "opening"])
 
+    @classmethod
+    def get_opening_stops(cls):
+        base = Asset.alias()
+        base_exchange_asset = ExchangeAsset.alias()
+        quote = Asset.alias()
+        quote_exchange_asset = ExchangeAsset.alias()
+        return (
+            cls.get_opening()
+            .select(
+                Position.id,
+                Position.entry_price,
+                Position.last_high,
+                Position.last_low,
+                UserStrategy.user.alias("user_id"),
+                BaseStrategy.side,
+                TradeEngine.stop_gain,
+                TradeEngine.trailing_gain,
+                TradeEngine.stop_loss,
+                TradeEngine.trailing_loss,
+                base_exchange_asset.exchange.alias("exchange_id"),
+                base.ticker.alias("base_ticker"),
+                quote.ticker.alias("quote_ticker"),
+                quote_exchange_asset.precision.alias("quote_precision"),
+            )
+            .join(TradeEngine, on=(BaseStrategy.stop_engine == TradeEngine.id))
+            .switch(BaseStrategy)
+            .join(Market)
+            .join(base_exchange_asset, on=(Market.base_id == base_exchange_asset.id))
+            .join(base, on=(base_exchange_asset.asset_id == base.id))
+            .switch(Market)
+            .join(quote_exchange_asset, on=(Market.quote_id == quote_exchange_asset.id))
+            .join(quote, on=(quote_exchange_asset.asset_id == quote.id))
+            .where(Position.entry_price != 0)
+            .where((TradeEngine.stop_gain > 0) | (TradeEngine.stop_loss > 0))
+        )
+
+    @classmethod
+    def refresh_all_stops(cls):
+        # evaluates the stops of every opening position with a single ticker
+        # request per exchange, returning the ids of the positions that tripped a
+        # stop or that could not be checked here, so they are checked one by one
+        positions = pandas.DataFrame(cls.get_opening_stops().dicts())
+        if positions.empty:
+            return []
+
+        positions["symbol"] = positions.base_ticker + "/" + positions.quote_ticker
+        positions["last_price"] = numpy.nan
+
+        pending = []
+        exchanges = ExchangeFactory.from_ids(positions.exchange_id.unique().tolist())
+
+        for exchange_id, group in positions.groupby("exchange_id"):
+            try:
+                exchange = ExchangeFactory.connect(exchanges[exchange_id])
+                tickers = exchange.api_fetch_tickers(group.symbol.unique().tolist())
+            except Exception as e:
+                exception(e, exc_info=True)
+                tickers = None
+
+            if not tickers:
+                pending += group.id.tolist()
+                continue
+
+            prices = group[["symbol", "quote_precision"]].drop_duplicates()
+            for idx, row in prices.iterrows():
+                try:
+                    p = tickers[row.symbol]["last"]
+                    if p is None:
+                        continue
+                    price = int(D(str(p)) * D("10") ** row.quote_precision)
+                except (KeyError, TypeError, InvalidOperation):
+                    # left unpriced, so they are checked one by one
+                    continue
+                match = (positions.symbol == row.symbol) & (
+                    positions.exchange_id == exchange_id
+                )
+                positions.loc[match, "last_price"] = price
+
+        unpriced = positions.last_price.isna() & ~positions.id.isin(pending)
+        pending += positions.loc[unpriced].id.tolist()
+        positions = positions.loc[positions.last_price.notna()].copy()
+
+        price = positions.last_price.astype("int64")
+        high = numpy.maximum(positions.last_high, price)
+        low = positions.last_low.where(
+            (positions.last_low != 0) & (positions.last_low <= price), price
+        )
+
+        changed = (high != positions.last_high) | (low != positions.last_low)
+        for id, h, l in zip(positions.id[changed], high[changed], low[changed]):
+            cls.update(last_high=h, last_low=l).where(cls.id == id).execute()
+
+        tripped = cls.get_stopped(positions, price, high, low)
+        pending += positions.loc[tripped].id.tolist()
+
+        return pending
+
+    @staticmethod
+    def get_stopped(positions, price, high, low):
+        # vectorized refresh_stops, one quantum of slack makes up for the rounding
+        # of get_return so that positions are never missed, the exact check is
+        # done again by refresh_stops
+        slack = 0.0001
+        ret_p = (price / positions.entry_price - 1) * 100
+        ret_h = (price / high - 1) * 100
+        ret_l = (price / low - 1) * 100
+
+        stop_gain = positions.stop_gain.astype(float) - slack
+        stop_loss = positions.stop_loss.astype(float) - slack
+        trailing_gain = positions.trailing_gain.astype(bool)
+        trailing_loss = positions.trailing_loss.astype(bool)
+        long = positions.side == "long"
+        short = positions.side == "short"
+
+        gain = (
+            long & trailing_gain & (ret_h * -1 > stop_gain)
+            | long & ~trailing_gain & (ret_p > stop_gain)
+            | short & trailing_gain & (ret_l > stop_gain)
+            | short & ~trailing_gain & (ret_p * -1 > stop_gain)
+        )
+        loss = (
+            long & trailing_loss & (ret_l > stop_loss)
+            | long & ~trailing_loss & (ret_p * -1 > stop_loss)
+            | short & trailing_loss & (ret_h * -1 > stop_loss)
+            | short & ~trailing_loss & (ret_p > stop_loss)
+        )
+
+        return (positions.stop_gain > 0) & gain | (positions.stop_loss > 0) & loss
+
     @classmethod
     def get_open(cls):
         return cls.get_all().where(cls.status << ["open", "opening", "closing"])
@@ -129,6 +265,100 @@ class Position(db.BaseModel):
     def get_open_by_user_strategy(self, user_strategy):
         return self.get_open().where(Position.user_strategy == user_strategy)
 
+    @classmethod
+    def get_graph(cls, ids):
+        # loads the positions along with every row their refresh walks through,
+        # from the user strategy down to the engines, assets, exchange and active
+        # credential, in a single query, sharing one instance per row
+        buy_engine = TradeEngine.alias()
+        sell_engine = TradeEngine.alias()
+        stop_engine = TradeEngine.alias()
+        base = ExchangeAsset.alias()
+        base_asset = Asset.alias()
+        quote = ExchangeAsset.alias()
+        quote_asset = Asset.alias()
+        query = (
+            cls.select(
+                cls,
+                UserStrategy,
+                User,
+                BaseStrategy,
+                buy_engine,
+                sell_engine,
+                stop_engine,
+                Market,
+                base,
+                base_asset,
+                Exchange,
+                quote,
+                quote_asset,
+                Credential,
+            )
+            .join(UserStrategy)
+            .join(User, on=(UserStrategy.user == User.id), attr="user")
+            .switch(UserStrategy)
+            .join(BaseStrategy)
+            .join(
+                buy_engine,
+                on=(BaseStrategy.buy_engine == buy_engine.id),
+                attr="buy_engine",
+            )
+            .switch(BaseStrategy)
+            .join(
+                sell_engine,
+                on=(BaseStrategy.sell_engine == sell_engine.id),
+                attr="sell_engine",
+            )
+            .switch(BaseStrategy)
+            .join(
+                stop_engine,
+                peewee.JOIN.LEFT_OUTER,
+                on=(BaseStrategy.stop_engine == stop_engine.id),
+                attr="stop_engine",
+            )
+            .switch(BaseStrategy)
+            .join(Market)
+            .join(base, on=(Market.base == base.id), attr="base")
+            .join(base_asset, on=(base.asset == base_asset.id), attr="asset")
+            .switch(base)
+            .join(Exchange, on=(base.exchange == Exchange.id), attr="exchange")
+            .switch(Market)
+            .join(quote, on=(Market.quote == quote.id), attr="quote")
+            .join(quote_asset, on=(quote.asset == quote_asset.id), attr="asset")
+            .switch(cls)
+            .join(
+                Credential,
+                peewee.JOIN.LEFT_OUTER,
+                on=(
+                    (Credential.user == User.id)
+                    & (Credential.exchange == Exchange.id)
+                    & Credential.active
+                ),
+                attr="_credential",
+            )
+            .where(cls.id << list(ids))
+        )
+
+        identity = db.IdentityMap()
+        positions = {}
+        for position in query:
+            # a user with several active credentials for the exchange gets one
+            # row for each, and any of them will do
+            if position.id in positions:
+                continue
+
+            credential = getattr(position, "_credential", None)
+            if credential is not None:
+                credential = identity.add(credential)
+
+            position = identity.add(position)
+            position._credential = credential
+            positions[position.id] = position
+
+        identity.link()
+
+        return list(positions.values())
+
     @property
     def exchange(self):
         if hasattr(self, "_exchange"):
@@ -136,10 +366,14 @@ class Position(db.BaseModel):
 
         user = self.user_strategy.user
         exchange = self.user_strategy.strategy.market.base.exchange
-        try:
-            credential = user.get_active_credential(exchange).get()
-        except Credential.DoesNotExist:
-            raise DisablingError("no credential for exchange")
+
+        # loaded along with the position by get_graph
+        credential = getattr(self, "_credential", None)
+        if credential is None:
+            try:
+                credential = user.get_active_credential(exchange).get()
+            except Credential.DoesNotExist:
+                raise DisablingError("no credential for exchange")
 
         exchange = ExchangeFactory.from_credential(credential)
 
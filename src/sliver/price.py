@@ -1,3 +1,5 @@
+import numpy
+import pandas
 import peewee
 
 import sliver.database as db
@@ -33,3 +35,88 @@ class Price(db.BaseModel):
             .where(cls.timeframe == strategy.timeframe)
             .order_by(cls.time)
         )
+
+    @classmethod
+    def copy_upsert(cls, prices):
+        # merges prices into the table, overwriting existing candles; must run
+        # inside a transaction
+        fields = [
+            cls.market,
+            cls.timeframe,
+            cls.time,
+            cls.open,
+            cls.high,
+            cls.low,
+            cls.close,
+            cls.volume,
+        ]
+        columns = [f.column_name for f in fields]
+        rows = list(prices[columns].itertuples(index=False, name=None))
+
+        return db.copy_upsert(cls, fields, rows, [cls.market, cls.timeframe, cls.time])
+
+
+class PriceBackfill(db.BaseModel):
+    # time windows of a backfill in progress, so that it resumes where it stopped
+    market = peewee.DeferredForeignKey("Market", null=True)
+    timeframe = peewee.TextField()
+    start_time = peewee.DateTimeField()
+    end_time = peewee.DateTimeField()
+    done = peewee.BooleanField(default=False)
+
+    class Meta:
+        constraints = [peewee.SQL("UNIQUE (market_id, timeframe, start_time)")]
+
+    @classmethod
+    def get_pending(cls, market, timeframe):
+        return list(
+            cls.select()
+            .where(cls.market == market)
+            .where(cls.timeframe == timeframe)
+            .where(~cls.done)
+            .order_by(cls.start_time)
+        )
+
+
+class PriceBuffer:
+    # growable column arrays holding candles as they are fetched page by page
+    def __init__(self, capacity=1024):
+        self.size = 0
+        self.time = numpy.empty(max(capacity, 1), dtype="datetime64[ns]")
+        self.ohlcv = numpy.empty((max(capacity, 1), 5), dtype="float64")
+
+    def __len__(self):
+        return self.size
+
+    def append(self, page):
+        end = self.size + len(page)
+
+        if end > len(self.time):
+            capacity = max(2 * len(self.time), end)
+            time = numpy.empty(capacity, dtype="datetime64[ns]")
+            ohlcv = numpy.empty((capacity, 5), dtype="float64")
+            time[: self.size] = self.time[: self.size]
+            ohlcv[: self.size] = self.ohlcv[: self.size]
+            self.time, self.ohlcv = time, ohlcv
+
+        self.time[self.size : end] = page.time.to_numpy(dtype="datetime64[ns]")
+        self.ohlcv[self.size : end] = page[
+            ["open", "high", "low", "close", "volume"]
+        ].to_numpy(dtype="float64", na_value=numpy.nan)
+        self.size = end
+
+    def to_frame(self):
+        # returns the candles sorted by time, without duplicates
+        order = numpy.argsort(self.time[: self.size], kind="stable")
+        time = self.time[order]
+        ohlcv = self.ohlcv[order]
+
+        unique = numpy.ones(len(time), dtype=bool)
+        unique[:-1] = time[1:] != time[:-1]
+
+        prices = pandas.DataFrame(
+            ohlcv[unique], columns=["open", "high", "low", "close", "volume"]
+        )
+        prices.insert(0, "time", time[unique])
+
+        return prices
@@ -1,14 +1,11 @@
-import decimal
-
 import pandas
 import peewee
 
 import sliver.database as db
 from sliver.indicator import Indicator
-from sliver.indicators.bb import BB
+from sliver.indicators.stream import BB
 from sliver.strategies.signals import StrategySignals
 from sliver.strategy import IStrategy
-from sliver.utils import quantize
 
 
 class BBIndicator(db.BaseModel):
@@ -38,29 +35,28 @@ class BBStrategy(IStrategy):
         if df.empty:
             return df
 
-        df.ma = df.ma.apply(lambda x: decimal.Decimal(x) if x else 0)
-        df.bolu = df.bolu.apply(lambda x: decimal.Decimal(x) if x else 0)
-        df.bold = df.bold.apply(lambda x: decimal.Decimal(x) if x else 0)
-        df.ma = df.ma * df.quote_precision
-        df.bolu = df.bolu * df.quote_precision
-        df.bold = df.bold * df.quote_precision
-        df.ma = df.apply(lambda x: quantize(x, "ma", "price_precision"), axis=1)
-        df.bolu = df.apply(lambda x: quantize(x, "bolu", "price_precision"), axis=1)
-        df.bold = df.apply(lambda x: quantize(x, "bold", "price_precision"), axis=1)
+        self.format_prices(df, ["ma", "bolu", "bold"])
 
         return df
 
+    def get_lookback(self):
+        return self.get_ma_lookback(self.ma_period, self.use_ema)
+
+    def get_streams(self):
+        return {
+            "bb": BB(
+                ma_period=self.ma_period,
+                num_std=self.num_std,
+                use_ema=self.use_ema,
+            )
+        }
+
     def refresh_indicators(self, indicators, pending, reset=False):
         BUY = StrategySignals.BUY
         NEUTRAL = StrategySignals.NEUTRAL
         SELL = StrategySignals.SELL
 
-        indicators = BB(
-            indicators,
-            ma_period=self.ma_period,
-            num_std=self.num_std,
-            use_ema=self.use_ema,
-        )
+        self.refresh_streams(indicators, pending, reset=reset)
 
         buy_rule = indicators.close > indicators.bold
         sell_rule = indicators.close < indicators.bolu
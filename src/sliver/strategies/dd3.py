@@ -1,12 +1,10 @@
-import decimal
-
 import peewee
 
 import sliver.database as db
 from sliver.indicator import Indicator
+from sliver.indicators.stream import SMA
 from sliver.strategies.signals import StrategySignals
 from sliver.strategy import IStrategy
-from sliver.utils import quantize
 
 
 class DD3Indicator(db.BaseModel):
@@ -35,28 +33,28 @@ class DD3Strategy(IStrategy):
         if df.empty:
             return df
 
-        df.ma1 = df.ma1.apply(lambda x: decimal.Decimal(x) if x else 0)
-        df.ma2 = df.ma2.apply(lambda x: decimal.Decimal(x) if x else 0)
-        df.ma3 = df.ma3.apply(lambda x: decimal.Decimal(x) if x else 0)
-        df.ma1 = df.ma1 * df.quote_precision
-        df.ma2 = df.ma2 * df.quote_precision
-        df.ma3 = df.ma3 * df.quote_precision
-        df.ma1 = df.apply(lambda x: quantize(x, "ma1", "price_precision"), axis=1)
-        df.ma2 = df.apply(lambda x: quantize(x, "ma2", "price_precision"), axis=1)
-        df.ma3 = df.apply(lambda x: quantize(x, "ma3", "price_precision"), axis=1)
+        self.format_prices(df, ["ma1", "ma2", "ma3"])
 
         return df
 
+    def get_lookback(self):
+        return max(self.ma1_period, self.ma2_period, self.ma3_period)
+
+    def get_streams(self):
+        return {
+            "ma1": SMA(self.ma1_period),
+            "ma2": SMA(self.ma2_period),
+            "ma3": SMA(self.ma3_period),
+        }
+
     def refresh_indicators(self, indicators, pending, reset=False):
         BUY = StrategySignals.BUY
         NEUTRAL = StrategySignals.NEUTRAL
         SELL = StrategySignals.SELL
 
-        indicators.ma1 = indicators.close.rolling(self.ma1_period).mean()
+        self.refresh_streams(indicators, pending, reset=reset)
         indicators.ma1.fillna(method="bfill", inplace=True)
-        indicators.ma2 = indicators.close.rolling(self.ma2_period).mean()
         indicators.ma2.fillna(method="bfill", inplace=True)
-        indicators.ma3 = indicators.close.rolling(self.ma3_period).mean()
         indicators.ma3.fillna(method="bfill", inplace=True)
 
         buy_rule = (
@@ -1,13 +1,10 @@
-import decimal
-
 import peewee
-from pandas_ta.momentum.rsi import rsi
 
 import sliver.database as db
 from sliver.indicator import Indicator
+from sliver.indicators.stream import EMA, RSI, SMA
 from sliver.strategies.signals import StrategySignals
 from sliver.strategy import IStrategy
-from sliver.utils import quantize
 
 
 class ElNinoIndicator(db.BaseModel):
@@ -41,22 +38,33 @@ class ElNinoStrategy(IStrategy):
         if df.empty:
             return df
 
-        df.ma = df.ma.apply(lambda x: decimal.Decimal(x) if x else 0)
-        df.ma = df.ma * df.quote_precision
-        df.ma = df.apply(lambda x: quantize(x, "ma", "price_precision"), axis=1)
+        self.format_prices(df, ["ma"])
 
         return df
 
+    def get_lookback(self):
+        return max(
+            self.get_ma_lookback(self.elnino_ma_period, self.elnino_use_ema),
+            self.get_ma_lookback(self.elnino_rsi_period, exponential=True),
+        )
+
+    def get_streams(self):
+        if self.elnino_use_ema:
+            ma = EMA(com=self.elnino_ma_period)
+        else:
+            ma = SMA(self.elnino_ma_period)
+
+        return {
+            "ma": ma,
+            "rsi": RSI(self.elnino_rsi_period, self.elnino_rsi_scalar, ewm=True),
+        }
+
     def refresh_indicators(self, indicators, pending, reset=False):
         BUY = StrategySignals.BUY
         NEUTRAL = StrategySignals.NEUTRAL
         SELL = StrategySignals.SELL
 
-        if self.elnino_use_ema:
-            indicators.ma = indicators.close.ewm(self.elnino_ma_period).mean()
-        else:
-            indicators.ma = indicators.close.rolling(self.elnino_ma_period).mean()
-
+        self.refresh_streams(indicators, pending, reset=reset)
         indicators.ma.fillna(method="bfill", inplace=True)
 
         indicators["buy_ma"] = indicators.ma * (
@@ -66,12 +74,6 @@ class ElNinoStrategy(IStrategy):
             1 + (float(self.elnino_sell_ma_offset) / 100)
         )
 
-        indicators["rsi"] = rsi(
-            indicators.close,
-            length=self.elnino_rsi_period,
-            scalar=self.elnino_rsi_scalar,
-        )
-
         indicators.rsi.fillna(method="bfill", inplace=True)
 
         buy_rule = (
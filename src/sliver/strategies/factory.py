@@ -32,38 +32,49 @@ class StrategyTypes(enum.IntEnum):
 
 
 class StrategyFactory:
+    models = {
+        StrategyTypes.MANUAL: Manual,
+        StrategyTypes.RANDOM: Random,
+        StrategyTypes.HYPNOX: Hypnox,
+        StrategyTypes.DD3: DD3,
+        StrategyTypes.MIXER: Mixer,
+        StrategyTypes.BB: BB,
+        StrategyTypes.MA_CROSS: MACross,
+        StrategyTypes.SWAPPERBOX: SwapperBox,
+        # StrategyTypes.WINDRUNNER: Windrunner,
+        StrategyTypes.HYPNOXV2: Hypnoxv2,
+        StrategyTypes.ELNINO: ElNino,
+        StrategyTypes.LANINA: LaNina,
+    }
+
+    # models whose tables were ensured by this process
+    ready = set()
+
     @classmethod
-    def from_base(cls, strategy):
-        model = None
+    def setup(cls, model):
+        if model in cls.ready:
+            return
 
-        if strategy.type == StrategyTypes.BB:
-            model = BB
-        elif strategy.type == StrategyTypes.DD3:
-            model = DD3
-        elif strategy.type == StrategyTypes.HYPNOX:
-            model = Hypnox
-        elif strategy.type == StrategyTypes.MA_CROSS:
-            model = MACross
-        elif strategy.type == StrategyTypes.MANUAL:
-            model = Manual
-        elif strategy.type == StrategyTypes.MIXER:
-            model = Mixer
-        elif strategy.type == StrategyTypes.RANDOM:
-            model = Random
-        elif strategy.type == StrategyTypes.SWAPPERBOX:
-            model = SwapperBox
-        # elif strategy.type == StrategyTypes.WINDRUNNER:
-        #     model = Windrunner
-        elif strategy.type == StrategyTypes.HYPNOXV2:
-            model = Hypnoxv2
-        elif strategy.type == StrategyTypes.ELNINO:
-            model = ElNino
-        elif strategy.type == StrategyTypes.LANINA:
-            model = LaNina
+        model.setup()
+        cls.ready.add(model)
+
+    @classmethod
+    def setup_all(cls):
+        for model in cls.models.values():
+            cls.setup(model)
 
-        if model is None:
+    @classmethod
+    def from_base(cls, strategy):
+        try:
+            model = cls.models[strategy.type]
+        except KeyError:
             raise DisablingError("invalid strategy type")
 
-        model.setup()
+        cls.setup(model)
+
+        st = model.get_or_create(strategy=strategy)[0]
+
+        # keeps the base strategy as loaded, along with the rows joined to it
+        st.strategy = strategy
 
-        return model.get_or_create(strategy=strategy)[0]
+        return st
@@ -147,9 +147,17 @@ class HypnoxStrategy(IStrategy):
             mean = 0
             variance = 0
         else:
-            n_samples = pending.iloc[-1].n_samples
-            mean = pending.iloc[-1].mean
-            variance = pending.iloc[-1].variance
+            # the stats of the last computed row are combined with the new tweets
+            computed = indicators.loc[indicators.n_samples.notnull()]
+            if computed.empty:
+                n_samples = 0
+                mean = 0
+                variance = 0
+            else:
+                last = computed.iloc[-1]
+                n_samples = last["n_samples"]
+                mean = last["mean"]
+                variance = last["variance"]
 
         if pending.empty:
             return
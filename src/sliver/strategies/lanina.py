@@ -1,15 +1,15 @@
-import decimal
-
 import peewee
-from pandas_ta.momentum.rsi import rsi
+from pandas_ta.overlap.ma import ma
 
 import sliver.database as db
 from sliver.indicator import Indicator
+from sliver.indicators.stream import RSI, SMA, SeededEMA
 from sliver.strategies.signals import StrategySignals
 from sliver.strategy import IStrategy
-from sliver.utils import quantize
 
-from pandas_ta.overlap.ma import ma
+# moving averages computed as pandas_ta's by streams, other modes are computed
+# with pandas_ta over the whole window
+ma_streams = {"sma": SMA, "ema": SeededEMA}
 
 
 class LaNinaIndicator(db.BaseModel):
@@ -66,51 +66,53 @@ class LaNinaStrategy(IStrategy):
         if df.empty:
             return df
 
-        df.root_ma = df.root_ma.apply(lambda x: decimal.Decimal(x) if x else 0)
-        df.root_ma = df.root_ma * df.quote_precision
-        df.root_ma = df.apply(
-            lambda x: quantize(x, "root_ma", "price_precision"), axis=1
+        self.format_prices(df, ["root_ma", "ma1", "ma2", "ma3"])
+
+        return df
+
+    def get_lookback(self):
+        # buys after a bull cross depend on every cross before them
+        if self.lanina_cross_active and self.lanina_bull_cross_active:
+            return None
+
+        lookback = max(
+            self.get_ma_lookback(self.lanina_rsi_period, exponential=True),
+            self.get_ma_lookback(
+                self.lanina_root_ma_period, self.lanina_root_ma_mode != "sma"
+            ),
+            self.get_ma_lookback(self.lanina_ma1_period, self.lanina_ma1_mode != "sma"),
+            self.get_ma_lookback(self.lanina_ma2_period, self.lanina_ma2_mode != "sma"),
+            self.get_ma_lookback(self.lanina_ma3_period, self.lanina_ma3_mode != "sma"),
         )
 
-        df.ma1 = df.ma1.apply(lambda x: decimal.Decimal(x) if x else 0)
-        df.ma1 = df.ma1 * df.quote_precision
-        df.ma1 = df.apply(lambda x: quantize(x, "ma1", "price_precision"), axis=1)
+        return lookback + abs(self.lanina_cross_sell_min_closes_below) + 1
 
-        df.ma2 = df.ma2.apply(lambda x: decimal.Decimal(x) if x else 0)
-        df.ma2 = df.ma2 * df.quote_precision
-        df.ma2 = df.apply(lambda x: quantize(x, "ma2", "price_precision"), axis=1)
+    def get_mas(self):
+        return {
+            "root_ma": (self.lanina_root_ma_mode, self.lanina_root_ma_period),
+            "ma1": (self.lanina_ma1_mode, self.lanina_ma1_period),
+            "ma2": (self.lanina_ma2_mode, self.lanina_ma2_period),
+            "ma3": (self.lanina_ma3_mode, self.lanina_ma3_period),
+        }
 
-        df.ma3 = df.ma3.apply(lambda x: decimal.Decimal(x) if x else 0)
-        df.ma3 = df.ma3 * df.quote_precision
-        df.ma3 = df.apply(lambda x: quantize(x, "ma3", "price_precision"), axis=1)
+    def get_streams(self):
+        streams = {"rsi": RSI(self.lanina_rsi_period, self.lanina_rsi_scalar, ewm=True)}
+        for column, (mode, period) in self.get_mas().items():
+            if mode in ma_streams:
+                streams[column] = ma_streams[mode](period)
 
-        return df
+        return streams
 
     def refresh_indicators(self, indicators, pending, reset=False):
         BUY = StrategySignals.BUY
         NEUTRAL = StrategySignals.NEUTRAL
         SELL = StrategySignals.SELL
 
-        indicators["rsi"] = rsi(
-            indicators.close,
-            length=self.lanina_rsi_period,
-            scalar=self.lanina_rsi_scalar,
-        )
+        self.refresh_streams(indicators, pending, reset=reset)
 
-        indicators["root_ma"] = ma(
-            self.lanina_root_ma_mode,
-            indicators.close,
-            length=self.lanina_root_ma_period,
-        )
-        indicators["ma1"] = ma(
-            self.lanina_ma1_mode, indicators.close, length=self.lanina_ma1_period
-        )
-        indicators["ma2"] = ma(
-            self.lanina_ma2_mode, indicators.close, length=self.lanina_ma2_period
-        )
-        indicators["ma3"] = ma(
-            self.lanina_ma3_mode, indicators.close, length=self.lanina_ma3_period
-        )
+        for column, (mode, period) in self.get_mas().items():
+            if mode not in ma_streams:
+                indicators[column] = ma(mode, indicators.close, length=period)
 
         indicators.rsi.fillna(method="bfill", inplace=True)
         indicators.root_ma.fillna(method="bfill", inplace=True)
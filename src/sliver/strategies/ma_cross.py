@@ -1,12 +1,10 @@
-import decimal
-
 import peewee
 
 import sliver.database as db
 from sliver.indicator import Indicator
+from sliver.indicators.stream import EMA, SMA
 from sliver.strategies.signals import StrategySignals
 from sliver.strategy import IStrategy
-from sliver.utils import quantize
 
 
 class MACrossIndicator(db.BaseModel):
@@ -35,29 +33,32 @@ class MACrossStrategy(IStrategy):
         if df.empty:
             return df
 
-        df.fast = df.fast.apply(lambda x: decimal.Decimal(x) if x else 0)
-        df.slow = df.slow.apply(lambda x: decimal.Decimal(x) if x else 0)
-        df.fast = df.fast * df.quote_precision
-        df.slow = df.slow * df.quote_precision
-        df.fast = df.apply(lambda x: quantize(x, "fast", "price_precision"), axis=1)
-        df.slow = df.apply(lambda x: quantize(x, "slow", "price_precision"), axis=1)
+        self.format_prices(df, ["fast", "slow"])
 
         return df
 
+    def get_lookback(self):
+        return max(
+            self.get_ma_lookback(self.fast_period, self.use_fast_ema),
+            self.get_ma_lookback(self.slow_period, self.use_slow_ema),
+        )
+
+    def get_streams(self):
+        return {
+            "fast": EMA(com=self.fast_period)
+            if self.use_fast_ema
+            else SMA(self.fast_period),
+            "slow": EMA(com=self.slow_period)
+            if self.use_slow_ema
+            else SMA(self.slow_period),
+        }
+
     def refresh_indicators(self, indicators, pending, reset=False):
         BUY = StrategySignals.BUY
         NEUTRAL = StrategySignals.NEUTRAL
         SELL = StrategySignals.SELL
 
-        if self.use_fast_ema:
-            indicators.fast = indicators.close.ewm(self.fast_period).mean()
-        else:
-            indicators.fast = indicators.close.rolling(self.fast_period).mean()
-
-        if self.use_slow_ema:
-            indicators.slow = indicators.close.ewm(self.slow_period).mean()
-        else:
-            indicators.slow = indicators.close.rolling(self.slow_period).mean()
+        self.refresh_streams(indicators, pending, reset=reset)
 
         indicators.fast.fillna(method="bfill", inplace=True)
         indicators.slow.fillna(method="bfill", inplace=True)
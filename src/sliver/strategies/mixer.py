@@ -27,6 +27,14 @@ class MixedStrategies(db.BaseModel):
     class Meta:
         constraints = [peewee.SQL("UNIQUE (mixer_id, strategy_id)")]
 
+    @classmethod
+    def get_by_mixers(cls, mixers):
+        return (
+            cls.select(cls, BaseStrategy)
+            .join(BaseStrategy, on=cls.strategy)
+            .where(cls.mixer << [m.id for m in mixers])
+        )
+
 
 class MixerStrategy(IStrategy):
     buy_threshold = peewee.DecimalField(default=1)
@@ -1,4 +1,3 @@
-import decimal
 from logging import info
 
 import pandas
@@ -17,7 +16,6 @@ from sliver.indicators.renko import RENKO
 from sliver.strategies.hypnox import HypnoxScore, HypnoxTweet, replay
 from sliver.strategies.signals import StrategySignals
 from sliver.strategy import IStrategy
-from sliver.utils import quantize
 
 
 class WindrunnerIndicator(db.BaseModel):
@@ -68,12 +66,7 @@ class WindrunnerStrategy(IStrategy):
         if df.empty:
             return df
 
-        df.bolu = df.bolu.apply(lambda x: decimal.Decimal(x) if x else 0)
-        df.bold = df.bold.apply(lambda x: decimal.Decimal(x) if x else 0)
-        df.bolu = df.bolu * df.quote_precision
-        df.bold = df.bold * df.quote_precision
-        df.bolu = df.apply(lambda x: quantize(x, "bolu", "price_precision"), axis=1)
-        df.bold = df.apply(lambda x: quantize(x, "bold", "price_precision"), axis=1)
+        self.format_prices(df, ["bolu", "bold"])
 
         return df
 
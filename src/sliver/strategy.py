@@ -1,14 +1,18 @@
 import datetime
+import decimal
+import json
 from abc import ABCMeta, abstractmethod
-from decimal import Decimal as D
 from logging import info
 
+import numpy
 import pandas
 import peewee
 from flask_restful import fields, reqparse
 
 import sliver.database as db
+import sliver.money as money
 from sliver.indicator import Indicator
+from sliver.indicators.stream import CandleStream, Stream
 from sliver.market import Market
 from sliver.price import Price
 from sliver.strategies.signals import StrategySignals
@@ -18,7 +22,6 @@ from sliver.utils import (
     get_next_refresh,
     get_timeframe_in_seconds,
     parse_field_type,
-    quantize,
 )
 
 
@@ -48,11 +51,26 @@ class BaseStrategy(db.BaseModel):
 
     @property
     def symbol(self):
-        return self.market.get_symbol()
+        try:
+            return self._symbol
+        except AttributeError:
+            return self.market.get_symbol()
+
+    @symbol.setter
+    def symbol(self, symbol):
+        # set when selected along with the strategy, see User.get_strategies
+        self._symbol = symbol
 
     @property
     def exchange(self):
-        return self.market.base.exchange.name
+        try:
+            return self._exchange
+        except AttributeError:
+            return self.market.base.exchange.name
+
+    @exchange.setter
+    def exchange(self, exchange):
+        self._exchange = exchange
 
     @classmethod
     def stop_all(cls):
@@ -71,13 +89,23 @@ class BaseStrategy(db.BaseModel):
             .order_by(cls.id.desc())
         )
 
+    @classmethod
+    def get_existing_with_signal(cls):
+        # existing strategies, each with its latest signal set as signal
+        signal = peewee.fn.COALESCE(LatestSignal.signal, int(StrategySignals.NEUTRAL))
+        return (
+            cls.get_existing()
+            .join(LatestSignal, peewee.JOIN.LEFT_OUTER)
+            .select_extend(signal.alias("signal"))
+            .objects()
+        )
+
     @classmethod
     def get_pending(cls):
         return (
             cls.get_existing()
             .where(cls.next_refresh < datetime.datetime.utcnow())
-            .order_by(cls.type == 4)  # MIXER
-            .order_by(cls.next_refresh)
+            .order_by(cls.type == 4, cls.next_refresh)  # MIXER
         )
 
     @classmethod
@@ -157,13 +185,16 @@ class BaseStrategy(db.BaseModel):
     def is_fetching(self):
         return self.status == StrategyStatus.FETCHING
 
+    def is_pending(self):
+        return self.is_refreshing() or (
+            self.status == StrategyStatus.IDLE
+            and self.next_refresh < datetime.datetime.utcnow()
+        )
+
     def get_signal(self):
         try:
-            signal = (
-                self.indicator_set.join(Price).order_by(Price.time.desc()).get().signal
-            )
-            return StrategySignals(signal)
-        except Indicator.DoesNotExist:
+            return StrategySignals(LatestSignal.get_by_id(self.id).signal)
+        except LatestSignal.DoesNotExist:
             return StrategySignals.NEUTRAL
 
     def get_indicators(self, model=None, join_type=None):
@@ -207,56 +238,41 @@ class BaseStrategy(db.BaseModel):
         if df.empty:
             return df
 
-        def p(p):
-            return D("10") ** (D("-1") * p)
+        price_decimals = self.market.price_precision
+        amount_decimals = self.market.amount_precision
+        quote_precision = self.market.quote.precision
+        base_precision = self.market.base.precision
 
-        self.amount_precision = D(self.market.amount_precision)
-        self.base_precision = p(self.market.base.precision)
-        self.price_precision = D(self.market.price_precision)
-        self.quote_precision = p(self.market.quote.precision)
-
-        df["amount_precision"] = self.amount_precision
-        df["base_precision"] = self.base_precision
-        df["price_precision"] = self.price_precision
-        df["quote_precision"] = self.quote_precision
-
-        df.open = df.open * df.quote_precision
-        df.high = df.high * df.quote_precision
-        df.low = df.low * df.quote_precision
-        df.close = df.close * df.quote_precision
-        df.volume = df.volume * df.base_precision
-
-        df = df.set_index("time")
         sig = df.loc[df.signal != 0]
 
         # remove consecutive duplicated signals
         b = sig.loc[sig.signal.shift() != sig.signal].loc[sig.signal == BUY].index
         s = sig.loc[sig.signal.shift() != sig.signal].loc[sig.signal == SELL].index
 
-        df["buys"] = D(0)
-        df["sells"] = D(0)
-
-        df.loc[b, "buys"] = df.loc[b, "close"].fillna(D(0)) * D("0.995")
-        df.loc[s, "sells"] = df.loc[s, "close"].fillna(D(0)) * D("1.005")
-
-        df = df.reset_index()
-
-        df.buys = df.apply(lambda x: quantize(x, "buys", "price_precision"), axis=1)
-        df.buys.replace({0: None}, inplace=True)
-
-        df.sells = df.apply(lambda x: quantize(x, "sells", "price_precision"), axis=1)
-        df.sells.replace({0: None}, inplace=True)
-
-        df.open = df.apply(lambda x: quantize(x, "open", "price_precision"), axis=1)
-        df.high = df.apply(lambda x: quantize(x, "high", "price_precision"), axis=1)
-        df.low = df.apply(lambda x: quantize(x, "low", "price_precision"), axis=1)
-        df.close = df.apply(lambda x: quantize(x, "close", "price_precision"), axis=1)
-        df.volume = df.apply(
-            lambda x: quantize(x, "volume", "amount_precision"), axis=1
+        # buys and sells are drawn 0.5% below and above the close
+        df["buys"] = numpy.nan
+        df["sells"] = numpy.nan
+        df.loc[b, "buys"] = money.render_array(
+            df.loc[b, "close"] * 995, quote_precision + 3, price_decimals
         )
+        df.loc[s, "sells"] = money.render_array(
+            df.loc[s, "close"] * 1005, quote_precision + 3, price_decimals
+        )
+
+        self.format_prices(df, ["open", "high", "low", "close"])
+        df.volume = money.render_array(df.volume, base_precision, amount_decimals)
 
         return df
 
+    def format_prices(self, df, columns):
+        # renders price columns in place, from quote units to price decimals
+        for column in columns:
+            df[column] = money.render_array(
+                df[column],
+                self.market.quote.precision,
+                self.market.price_precision,
+            )
+
     def enable(self):
         self.status = StrategyStatus.IDLE
         self.next_refresh = datetime.datetime.utcnow()
@@ -294,10 +310,78 @@ class BaseStrategy(db.BaseModel):
         self.save()
 
 
+class LatestSignal(db.BaseModel):
+    # signal of the last candle with indicators, kept by update_indicators
+    strategy = peewee.ForeignKeyField(
+        BaseStrategy, primary_key=True, on_delete="CASCADE"
+    )
+    signal = peewee.IntegerField()
+    time = peewee.DateTimeField()
+    refreshed_at = peewee.DateTimeField()
+
+    @classmethod
+    def update_signal(cls, strategy, signal, time):
+        # older candles never replace the latest one
+        cls.insert(
+            strategy=strategy,
+            signal=signal,
+            time=time,
+            refreshed_at=datetime.datetime.utcnow(),
+        ).on_conflict(
+            conflict_target=[cls.strategy],
+            preserve=[cls.signal, cls.time, cls.refreshed_at],
+            where=(cls.time <= peewee.EXCLUDED.time),
+        ).execute()
+
+
+class StreamState(db.BaseModel):
+    # streaming indicators of a strategy as they were after the candle at time,
+    # along with their initial state, which tells their parameters apart
+    strategy = peewee.ForeignKeyField(
+        BaseStrategy, primary_key=True, on_delete="CASCADE"
+    )
+    time = peewee.DateTimeField()
+    params = peewee.TextField()
+    state = peewee.TextField()
+
+    @staticmethod
+    def get_params(streams):
+        return json.dumps({k: s.get_state() for k, s in streams.items()})
+
+    @classmethod
+    def load(cls, strategy, params, time):
+        saved = cls.get_or_none(
+            (cls.strategy == strategy) & (cls.time == time) & (cls.params == params)
+        )
+        if saved is None:
+            return None
+
+        return {k: Stream.from_state(v) for k, v in json.loads(saved.state).items()}
+
+    @classmethod
+    def save_state(cls, strategy, params, streams, time):
+        cls.insert(
+            strategy=strategy,
+            time=time,
+            params=params,
+            state=cls.get_params(streams),
+        ).on_conflict(
+            conflict_target=[cls.strategy],
+            preserve=[cls.time, cls.params, cls.state],
+        ).execute()
+
+
 class IStrategy(db.BaseModel):
     __metaclass__ = ABCMeta
     strategy = peewee.ForeignKeyField(BaseStrategy, primary_key=True)
 
+    # exponential averages warm up over this many times their period, after which
+    # the weight left to older candles is below e^-10
+    ema_warmup = 10
+
+    # streams left by refresh_streams, saved along with the indicators
+    stream_state = None
+
     @property
     def id(self):
         return self.strategy.id
@@ -318,6 +402,89 @@ class IStrategy(db.BaseModel):
     def refresh_indicators(self, indicators, pending, reset=False):
         ...
 
+    def get_lookback(self):
+        # number of candles needed before the pending ones to compute them, or
+        # None if indicators depend on the whole history
+        return None
+
+    def get_ma_lookback(self, period, exponential=False):
+        if exponential:
+            return (period + 1) * self.ema_warmup
+        return period
+
+    def get_streams(self):
+        # streaming indicators by column, see refresh_streams
+        return {}
+
+    def refresh_streams(self, indicators, pending, reset=False):
+        # fills the columns of get_streams, continuing from the streams saved
+        # after the last computed candle, or feeding them every candle in the
+        # frame when there are none or their parameters changed
+        streams = self.get_streams()
+        params = StreamState.get_params(streams)
+        rows = indicators
+
+        computed = indicators.loc[indicators.indicator_id.notnull()]
+        if not reset and not computed.empty and not pending.empty:
+            last = computed.time.iloc[-1].to_pydatetime()
+            if pending.time.iloc[0] > last:
+                saved = StreamState.load(self.strategy.id, params, last)
+                if saved is not None:
+                    streams = saved
+                    rows = pending
+
+        if rows.empty:
+            return
+
+        def fill(column, values):
+            # stored decimals load as objects, so the column is made numeric
+            if column in indicators:
+                indicators[column] = pandas.to_numeric(indicators[column])
+            indicators.loc[rows.index, column] = values
+
+        for column, stream in streams.items():
+            if isinstance(stream, CandleStream):
+                candles = {
+                    k: rows[k].to_numpy("float64")
+                    for k in ["open", "high", "low", "close"]
+                }
+                for field, values in stream.update_many(candles).items():
+                    fill(field, values)
+            else:
+                fill(column, stream.update_many(rows.close.to_numpy("float64")))
+
+        # saved in the same transaction as the rows, see update_indicators
+        self.stream_state = (params, streams, rows.time.iloc[-1].to_pydatetime())
+
+    def get_indicators_window(self, lookback):
+        # pending candles, from the earliest one so that holes left behind are
+        # filled too, preceded by the lookback ones before it
+        query = self.get_indicators()
+
+        first = (
+            query.where(Indicator.id.is_null())
+            .select(peewee.fn.MIN(Price.time))
+            .order_by()
+            .scalar()
+        )
+
+        previous = Price.get_by_strategy(self).select(Price.time)
+        if first is not None:
+            if lookback <= 0:
+                return query.where(Price.time >= first)
+            previous = previous.where(Price.time < first)
+
+        start = (
+            previous.order_by(Price.time.desc())
+            .offset(max(lookback - 1, 0))
+            .limit(1)
+            .scalar()
+        )
+        if start is None:
+            return query
+
+        return query.where(Price.time >= start)
+
     def get_indicators(self, **kwargs):
         return self.strategy.get_indicators(model=self.get_indicator_class(), **kwargs)
 
@@ -340,7 +507,13 @@ class IStrategy(db.BaseModel):
         info(f"stop engine is {self.stop_engine_id}")
 
         info("refreshing indicators")
-        indicators = pandas.DataFrame(self.get_indicators().dicts())
+        lookback = None if self.strategy.reset else self.get_lookback()
+        if lookback is None:
+            query = self.get_indicators()
+        else:
+            query = self.get_indicators_window(lookback)
+
+        indicators = pandas.DataFrame(query.dicts())
         indicators.strategy = self.strategy.id
         indicators.price = indicators.id
         pending = indicators.loc[indicators.indicator_id.isnull()].copy()
@@ -348,7 +521,10 @@ class IStrategy(db.BaseModel):
         indicators = self.refresh_indicators(
             indicators, pending, reset=self.strategy.reset
         )
-        if indicators is not None:
+        if indicators is not None and lookback is not None:
+            # warm-up candles already have their indicators saved
+            indicators = indicators.loc[indicators.price.isin(pending.price)]
+        if indicators is not None and not indicators.empty:
             self.update_indicators(indicators)
 
         signal = self.get_signal()
@@ -405,29 +581,88 @@ class IStrategy(db.BaseModel):
         return all_fields
 
     def update_indicators(self, indicators):
-        with db.connection.atomic():
-            Indicator.insert_many(
-                indicators[["strategy", "price", "signal"]].to_dict("records")
-            ).on_conflict(
-                conflict_target=[Indicator.strategy, Indicator.price],
-                preserve=[Indicator.signal],
-            ).execute()
-
-            model = self.get_indicator_class()
-            if model is None:
-                return
+        # writes only the rows that are new or have changed, comparing them with
+        # what is stored for the same candles
+        model = self.get_indicator_class()
 
-            updated = pandas.DataFrame(self.get_indicators().dicts())
-            indicators.indicator = updated.indicator_id
-
-            model_field_names = [f for f in model._meta.fields]
+        model_fields = []
+        if model is not None:
             model_fields = [
-                getattr(model, f) for f in model_field_names if f != "indicator"
+                f for f in model._meta.sorted_fields if f is not model.indicator
             ]
 
-            model.insert_many(
-                indicators[model_field_names].to_dict("records")
-            ).on_conflict(
-                conflict_target=[model.indicator],
-                preserve=model_fields,
-            ).execute()
+        fields = [Indicator.signal] + model_fields
+
+        query = (
+            self.get_indicators()
+            .select(Price.id, Indicator.id, *fields)
+            .where(Price.time >= indicators.time.min().to_pydatetime())
+        )
+        def rounded(field, value):
+            # decimals as their column keeps them, so unchanged rows compare equal
+            if not isinstance(field, peewee.DecimalField) or value is None:
+                return value
+            value = decimal.Decimal(str(value))
+            if not value.is_finite():
+                return value
+            exp = decimal.Decimal(1).scaleb(-field.decimal_places)
+            return value.quantize(exp, rounding=decimal.ROUND_HALF_UP)
+
+        def db_value(field, value):
+            if value is not None and pandas.isna(value):
+                value = None
+            return rounded(field, field.db_value(value))
+
+        stored = {
+            row[0]: (row[1], tuple(rounded(f, v) for f, v in zip(fields, row[2:])))
+            for row in query.tuples()
+        }
+
+        ids = {}
+        signals = []
+        values = {}
+
+        columns = ["price"] + [f.name for f in fields]
+        for row in indicators[columns].itertuples(index=False, name=None):
+            price = row[0]
+            new = tuple(db_value(f, v) for f, v in zip(fields, row[1:]))
+            indicator_id, old = stored.get(price, (None, None))
+
+            if indicator_id is None or old[0] != new[0]:
+                signals.append((self.strategy.id, price, new[0]))
+            else:
+                ids[price] = indicator_id
+
+            if model is not None and (indicator_id is None or old[1:] != new[1:]):
+                values[price] = new[1:]
+
+        info(f"writing {len(signals)} signals and {len(values)} indicators")
+
+        with db.connection.atomic():
+            if signals:
+                ids.update(
+                    db.upsert(
+                        Indicator,
+                        [Indicator.strategy, Indicator.price, Indicator.signal],
+                        signals,
+                        [Indicator.strategy, Indicator.price],
+                        returning=[Indicator.price, Indicator.id],
+                    )
+                )
+
+            if values:
+                db.upsert(
+                    model,
+                    [model.indicator] + model_fields,
+                    [(ids[price],) + new for price, new in values.items()],
+                    [model.indicator],
+                )
+
+            latest = indicators.loc[indicators.time.idxmax()]
+            LatestSignal.update_signal(
+                self.strategy.id, int(latest.signal), latest.time.to_pydatetime()
+            )
+
+            if self.stream_state is not None:
+                StreamState.save_state(self.strategy.id, *self.stream_state)
+                self.stream_state = None
@@ -9,8 +9,11 @@ from sliver.asset import Asset
 from sliver.balance import Balance
 from sliver.credential import Credential
 from sliver.exceptions import AuthenticationError
+from sliver.exchange import Exchange
 from sliver.exchange_asset import ExchangeAsset
 from sliver.exchanges.factory import ExchangeFactory
+from sliver.market import Market
+from sliver.strategy import BaseStrategy
 from sliver.user_strategy import UserStrategy
 
 
@@ -51,10 +54,45 @@ class User(db.BaseModel):
         return Balance.get_or_create(user_id=self.id, asset_id=exchange_asset.id)[0]
 
     def is_subscribed(self, strategy_id):
-        for u_st in self.userstrategy_set:
-            if u_st.strategy_id == strategy_id:
-                return u_st.active
-        return False
+        return (
+            self.userstrategy_set.where(UserStrategy.strategy == strategy_id)
+            .where(UserStrategy.active)
+            .exists()
+        )
+
+    def get_strategies(self):
+        # existing strategies with their latest signal, symbol, exchange and
+        # whether the user is subscribed to them, in a single query
+        base = Asset.alias()
+        base_exchange_asset = ExchangeAsset.alias()
+        quote = Asset.alias()
+        quote_exchange_asset = ExchangeAsset.alias()
+        subscribed = peewee.fn.COALESCE(UserStrategy.active, False)
+        return (
+            BaseStrategy.get_existing_with_signal()
+            .switch(BaseStrategy)
+            .join(Market)
+            .join(base_exchange_asset, on=(Market.base_id == base_exchange_asset.id))
+            .join(base, on=(base_exchange_asset.asset_id == base.id))
+            .switch(Market)
+            .join(quote_exchange_asset, on=(Market.quote_id == quote_exchange_asset.id))
+            .join(quote, on=(quote_exchange_asset.asset_id == quote.id))
+            .join(Exchange, on=(base_exchange_asset.exchange_id == Exchange.id))
+            .switch(BaseStrategy)
+            .join(
+                UserStrategy,
+                peewee.JOIN.LEFT_OUTER,
+                on=(
+                    (UserStrategy.strategy == BaseStrategy.id)
+                    & (UserStrategy.user == self.id)
+                ),
+            )
+            .select_extend(
+                subscribed.alias("subscribed"),
+                base.ticker.concat("/").concat(quote.ticker).alias("symbol"),
+                Exchange.name.alias("exchange"),
+            )
+        )
 
     def send_message(self, message):
         if not self.telegram_username:
@@ -108,6 +146,8 @@ class User(db.BaseModel):
         return balance
 
     def get_free_balances(self, strategy):
+        from sliver.position import Position
+
         base = strategy.market.base
         base_balance = self.get_exchange_balance(base).total
 
@@ -117,73 +157,64 @@ class User(db.BaseModel):
         info(f"base: {base.print(base_balance)}")
         info(f"quote: {quote.print(quote_balance)}")
 
+        # other active strategies of the user in the exchange, with the
+        # amounts reserved by their open positions, if any
+        query = (
+            UserStrategy.get_by_exchange(self, quote.exchange)
+            .where(UserStrategy.strategy != strategy.id)
+            .join(
+                Position,
+                peewee.JOIN.LEFT_OUTER,
+                on=(
+                    (Position.user_strategy == UserStrategy.id)
+                    & (Position.status << ["open", "opening", "closing"])
+                ),
+            )
+            .select(
+                BaseStrategy.side,
+                Market.base,
+                Market.quote,
+                Position.id,
+                Position.entry_amount,
+                Position.entry_cost,
+                Position.target_amount,
+                Position.target_cost,
+            )
+            .tuples()
+        )
+
         b_count = 0
         q_count = 0
 
-        for u_st in UserStrategy.get_by_exchange(self, quote.exchange):
-            strat = u_st.strategy
-            if strat == strategy:
+        for row in query:
+            side, m_base, m_quote, position_id = row[:4]
+            entry_amount, entry_cost, target_amount, target_cost = row[4:]
+
+            long = side == "long"
+            short = side == "short"
+            uses_quote = m_quote == quote.id if long else short and m_base == quote.id
+            uses_base = m_quote == base.id if long else short and m_base == base.id
+
+            if position_id is None:
+                q_count += uses_quote
+                b_count += uses_base
                 continue
 
-            pos = u_st.position
-
-            if pos is None:
-                if (strat.side == "long" and strat.market.quote == quote) or (
-                    strat.side == "short" and strat.market.base == quote
-                ):
-                    q_count += 1
-
-                if (strat.side == "long" and strat.market.quote == base) or (
-                    strat.side == "short" and strat.market.base == base
-                ):
-                    b_count += 1
-
-            else:
-                if strategy.side == "long":
-                    if (strat.side == "long" and strat.market.quote == quote) or (
-                        strat.side == "short" and strat.market.base == quote
-                    ):
-                        if strat.side == "long":
-                            base_balance -= pos.entry_amount
-                            quote_balance -= pos.target_cost
-
-                        elif strat.side == "short":
-                            base_balance -= pos.entry_cost
-                            quote_balance -= pos.target_amount
-
-                    if (strat.side == "long" and strat.market.quote == base) or (
-                        strat.side == "short" and strat.market.base == base
-                    ):
-                        if strat.side == "long":
-                            base_balance -= pos.target_cost
-                            quote_balance -= pos.entry_amount
-
-                        elif strat.side == "short":
-                            base_balance -= pos.target_amount
-                            quote_balance -= pos.entry_cost
-
-                elif strategy.side == "short":
-                    if (strat.side == "long" and strat.market.quote == base) or (
-                        strat.side == "short" and strat.market.base == base
-                    ):
-                        if strat.side == "long":
-                            base_balance -= pos.target_cost
-                            quote_balance -= pos.entry_amount
-
-                        elif strat.side == "short":
-                            base_balance -= pos.target_amount
-                            quote_balance -= pos.entry_cost
-
-                    if (strat.side == "long" and strat.market.quote == quote) or (
-                        strat.side == "short" and strat.market.base == quote
-                    ):
-                        if strat.side == "long":
-                            base_balance -= pos.entry_amount
-                            quote_balance -= pos.target_cost
-
-                        elif strat.side == "short":
-                            base_balance -= pos.entry_cost
-                            quote_balance -= pos.target_amount
+            if uses_quote:
+                if long:
+                    base_balance -= entry_amount
+                    quote_balance -= target_cost
+                else:
+                    base_balance -= entry_cost
+                    quote_balance -= target_amount
+
+            if uses_base:
+                if long:
+                    base_balance -= target_cost
+                    quote_balance -= entry_amount
+                else:
+                    base_balance -= target_amount
+                    quote_balance -= entry_cost
 
         base_balance /= b_count + 1
         quote_balance /= q_count + 1
@@ -1,9 +1,16 @@
+import datetime
+import heapq
 import logging
 import logging.config
 import multiprocessing
 import os
+import queue
+import select
 import time
 
+import peewee
+import psycopg2
+
 import sliver.database as db
 from sliver.alert import send_message
 from sliver.config import Config
@@ -12,9 +19,15 @@ from sliver.exceptions import (
     DisablingError,
     PostponingError,
 )
+from sliver.exchanges.cache import BalanceCache, TickerCache
+from sliver.exchanges.limiter import RateLimiter
+from sliver.market import Market
 from sliver.position import Position
+from sliver.strategies.factory import StrategyFactory, StrategyTypes
+from sliver.strategies.mixer import MixedStrategies
 from sliver.strategies.status import StrategyStatus
 from sliver.strategy import BaseStrategy
+from sliver.user_strategy import UserStrategy
 
 
 def get_file_handler(filename, filepath=None):
@@ -33,10 +46,16 @@ def get_file_handler(filename, filepath=None):
 
 
 class Watchdog:
-    def __init__(self, num_workers=None):
+    def __init__(self, num_workers=None, scheduler=False, routing=False):
         self.num_workers = num_workers if num_workers is not None else 1
+        self.scheduler = scheduler
+        self.routing = routing and self.num_workers > 1
+        self.blocked = {}
         self.proc_queue = multiprocessing.Queue()
         self.log_queue = multiprocessing.Queue()
+        self.queues = None
+        if self.routing:
+            self.queues = [multiprocessing.Queue() for w in range(self.num_workers)]
 
     def run(self):
         logging.config.dictConfig(
@@ -84,14 +103,28 @@ class Watchdog:
             for handler in logging.getLogger().handlers:
                 handler.formatter = None
             logging.handlers.QueueListener(self.log_queue, LogHandler()).start()
+            self.manager = multiprocessing.Manager()
+            RateLimiter.share(self.manager)
+            TickerCache.share(self.manager)
+            BalanceCache.share(self.manager)
             for w in range(self.num_workers):
-                p = Worker(self.proc_queue, self.log_queue)
+                if self.routing:
+                    p = Worker(self.queues[w], self.log_queue, queues=self.queues)
+                else:
+                    p = Worker(self.proc_queue, self.log_queue)
                 p.start()
 
         db.init()
+        StrategyFactory.setup_all()
         BaseStrategy.stop_all()
         Position.stop_all()
 
+        if self.scheduler:
+            self.schedule()
+        else:
+            self.poll()
+
+    def poll(self):
         while True:
             try:
                 self.refresh_opening_positions()
@@ -104,13 +137,49 @@ class Watchdog:
             except KeyboardInterrupt:
                 break
 
+    def schedule(self):
+        scheduler = Scheduler(interval=int(Config().WATCHDOG_INTERVAL))
+        scheduler.listen()
+        scheduler.sync()
+
+        while True:
+            try:
+                due = scheduler.wait()
+
+                if "stops" in due:
+                    self.refresh_opening_positions()
+                if "strategy" in due:
+                    self.refresh_idle_strategies()
+                    self.refresh_waiting_strategies()
+                if "position" in due:
+                    self.refresh_pending_positions()
+
+                scheduler.hold(self.blocked)
+
+            except KeyboardInterrupt:
+                break
+
+    def dispatch(self, task, affinity=None):
+        if self.num_workers == 1:
+            task.run()
+        elif self.routing:
+            # tasks sharing an exchange or credential stick to the same worker,
+            # which keeps its clients, markets and rate limit state warm
+            if affinity is None:
+                affinity = (task.kind, task.id)
+            self.queues[hash(affinity) % self.num_workers].put(task)
+        else:
+            self.proc_queue.put(task)
+
     def refresh_opening_positions(self):
-        for position in Position.get_opening():
+        ids = Position.refresh_all_stops()
+        if not ids:
+            return
+
+        query = Position.get_opening().where(Position.id << ids)
+        for position in self.get_routed_positions(query):
             t = Task(position, call="check_stops")
-            if self.num_workers == 1:
-                t.run()
-            else:
-                self.proc_queue.put(t)
+            self.dispatch(t, affinity=self.get_position_affinity(position))
 
     def refresh_idle_strategies(self):
         markets = {}
@@ -130,28 +199,70 @@ class Watchdog:
                 market=market,
                 timeframe=timeframe,
             )
-            if self.num_workers == 1:
-                t.run()
-            else:
-                self.proc_queue.put(t)
+            self.dispatch(t, affinity=("exchange", market.base.exchange_id))
 
     def refresh_waiting_strategies(self):
-        waiting = [base_st for base_st in BaseStrategy.get_waiting()]
+        query = BaseStrategy.get_waiting()
+        if self.routing:
+            query = query.join(Market).select_extend(Market.exchange)
+
+        waiting = [base_st for base_st in query]
+        mixers = [s for s in waiting if s.type == StrategyTypes.MIXER]
 
         for base_st in waiting:
-            t = Task(base_st)
-            if self.num_workers == 1:
-                t.run()
-            else:
-                self.proc_queue.put(t)
+            if base_st.type != StrategyTypes.MIXER:
+                self.dispatch(
+                    Task(base_st), affinity=self.get_strategy_affinity(base_st)
+                )
+
+        # mixers are held back until every mixin they read from is done with the
+        # current candle, which also covers mixins refreshed above by the workers
+        self.blocked = self.get_blocked_mixers(mixers)
+
+        for base_st in mixers:
+            if base_st.id not in self.blocked:
+                self.dispatch(
+                    Task(base_st), affinity=self.get_strategy_affinity(base_st)
+                )
+
+    def get_blocked_mixers(self, mixers):
+        blocked = {}
+
+        if not mixers:
+            return blocked
+
+        next_refresh = {m.id: m.next_refresh for m in mixers}
+
+        # only mixins pending a candle up to the mixer's are waited on, a shorter
+        # timeframe one is pending again every few minutes and would hold it back
+        for dep in MixedStrategies.get_by_mixers(mixers):
+            mixin = dep.strategy
+            if mixin.is_pending() and mixin.next_refresh <= next_refresh[dep.mixer_id]:
+                blocked.setdefault(dep.mixer_id, set()).add(dep.strategy_id)
+
+        return blocked
 
     def refresh_pending_positions(self):
-        for position in Position.get_pending():
-            t = Task(position)
-            if self.num_workers == 1:
-                t.run()
-            else:
-                self.proc_queue.put(t)
+        for position in self.get_routed_positions(Position.get_pending()):
+            self.dispatch(
+                Task(position), affinity=self.get_position_affinity(position)
+            )
+
+    def get_routed_positions(self, query):
+        if self.routing:
+            query = query.join(Market).select_extend(UserStrategy.user, Market.exchange)
+        return query
+
+    def get_position_affinity(self, position):
+        if not self.routing:
+            return None
+        u_st = position.user_strategy
+        return ("credential", u_st.user_id, u_st.strategy.market.exchange_id)
+
+    def get_strategy_affinity(self, base_st):
+        if not self.routing:
+            return None
+        return ("exchange", base_st.market.exchange_id)
 
     def refresh_risk(self):
         pass
@@ -165,46 +276,333 @@ class Watchdog:
     # maybe user.max_risk and user.max_volatility
 
 
+class Scheduler:
+    # keeps the next_refresh deadlines of every schedulable strategy and position
+    # in a min-heap and sleeps until the earliest one, waking up early when the
+    # database notifies a change (see migrations/20261018_watchdog_notify.py)
+    channel = "watchdog"
+    sync_interval = 300
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.heap = []
+        self.deadlines = {}
+        self.opening = set()
+        self.dependents = {}
+        self.conn = None
+
+    def listen(self):
+        # on a connection of its own, as peewee may close or reconnect the shared
+        # one, which would silently drop the subscription
+        if self.conn is not None and not self.conn.closed:
+            self.conn.close()
+
+        self.conn = psycopg2.connect(
+            dbname=db.connection.database, **db.connection.connect_params
+        )
+        self.conn.autocommit = True
+        with self.conn.cursor() as cursor:
+            cursor.execute(f"LISTEN {self.channel}")
+
+    def hold(self, blocked):
+        # mixers waiting on their mixins are resynced whenever one of them changes
+        self.dependents = {}
+        for mixer, mixins in blocked.items():
+            for mixin in mixins:
+                self.dependents.setdefault(mixin, set()).add(mixer)
+
+    def push(self, kind, id, deadline):
+        self.deadlines[(kind, id)] = deadline
+        heapq.heappush(self.heap, (deadline, kind, id))
+
+    def discard(self, kind, id):
+        self.deadlines.pop((kind, id), None)
+        if kind == "position":
+            self.opening.discard(id)
+
+    def sync(self, strategies=None, positions=None):
+        now = datetime.datetime.utcnow()
+
+        if strategies is None and positions is None:
+            self.heap = []
+            self.deadlines = {}
+            self.opening = set()
+            self.push("sync", 0, now + datetime.timedelta(seconds=self.sync_interval))
+
+        st_query = BaseStrategy.select(
+            BaseStrategy.id, BaseStrategy.next_refresh
+        ).where(BaseStrategy.status << [StrategyStatus.IDLE, StrategyStatus.WAITING])
+        if strategies is not None:
+            for id in strategies:
+                self.discard("strategy", id)
+            st_query = st_query.where(BaseStrategy.id << list(strategies))
+
+        pos_query = (
+            Position.get_idle()
+            .select(Position.id, Position.next_refresh, Position.status)
+            .where(Position.status << ["open", "opening", "closing"])
+        )
+        if positions is not None:
+            for id in positions:
+                self.discard("position", id)
+            pos_query = pos_query.where(Position.id << list(positions))
+
+        if strategies is None or strategies:
+            for base_st in st_query:
+                self.push("strategy", base_st.id, base_st.next_refresh)
+
+        if positions is None or positions:
+            for position in pos_query:
+                self.push("position", position.id, position.next_refresh)
+                if position.is_open():
+                    self.opening.add(position.id)
+
+        if self.opening and ("stops", 0) not in self.deadlines:
+            self.push("stops", 0, now)
+
+    def notified(self):
+        strategies = set()
+        positions = set()
+        user_strategies = set()
+
+        try:
+            self.conn.poll()
+        except psycopg2.Error as e:
+            # notifications may have been lost, so everything is resynced
+            logging.warning(f"reconnecting the {self.channel} listener: {e}")
+            self.listen()
+            self.sync()
+            return
+
+        while self.conn.notifies:
+            notify = self.conn.notifies.pop(0)
+            table, id = notify.payload.split()
+            if table == "strategy":
+                strategies.add(int(id))
+                strategies |= self.dependents.get(int(id), set())
+            elif table == "position":
+                positions.add(int(id))
+            elif table == "userstrategy":
+                user_strategies.add(int(id))
+
+        if strategies or user_strategies:
+            # positions are scheduled only while their strategy and subscription
+            # are active, so those depending on a changed one are resynced too
+            query = (
+                Position.select(Position.id)
+                .join(UserStrategy)
+                .where(
+                    (UserStrategy.id << list(user_strategies))
+                    | (UserStrategy.strategy << list(strategies))
+                )
+                .where(Position.status << ["open", "opening", "closing"])
+            )
+            positions |= {position.id for position in query}
+
+        if strategies or positions:
+            self.sync(strategies=strategies, positions=positions)
+
+    def pop_due(self):
+        now = datetime.datetime.utcnow()
+        due = set()
+        retry = []
+
+        while self.heap and self.heap[0][0] <= now:
+            deadline, kind, id = heapq.heappop(self.heap)
+            if self.deadlines.get((kind, id)) != deadline:
+                continue  # stale entry, superseded by a later sync
+
+            del self.deadlines[(kind, id)]
+            due.add(kind)
+            if kind in ["strategy", "position"]:
+                retry.append((kind, id))
+
+        # rows not picked up this time are retried after an interval, those
+        # picked up are resynced by their notify before that
+        for kind, id in retry:
+            self.push(kind, id, now + datetime.timedelta(seconds=self.interval))
+
+        if "sync" in due:
+            self.sync()
+
+        if "stops" in due and self.opening:
+            self.push("stops", 0, now + datetime.timedelta(seconds=self.interval))
+
+        return due
+
+    def get_timeout(self):
+        while self.heap:
+            deadline, kind, id = self.heap[0]
+            if self.deadlines.get((kind, id)) == deadline:
+                timeout = deadline - datetime.datetime.utcnow()
+                return max(timeout.total_seconds(), 0)
+            heapq.heappop(self.heap)
+
+        return self.sync_interval
+
+    def wait(self):
+        while True:
+            self.notified()
+
+            due = self.pop_due() - {"sync"}
+            if due:
+                return due
+
+            select.select([self.conn], [], [], self.get_timeout())
+
+
 class Task:
-    target = None
+    kind = None
+    id = None
     call = None
-    context = None
+    context_refs = None
+    refs = None
     kwargs = None
     log_context = None
+    target = None
+    context = None
+    loaded = None
+
+    # fields compared with their current values before a batch loaded task runs,
+    # a change means the object was refreshed, postponed or disabled meanwhile
+    versions = {
+        "position": ("status", "next_refresh", "refreshing"),
+        "strategy": ("status", "next_refresh"),
+    }
 
     def __init__(self, target, call=None, context=None, **kwargs):
-        self.target = target
-        self.call = call if call is not None else "refresh"
-        self.context = context if context is not None else [target]
-        self.kwargs = kwargs
-        self.log_context = f"{self.target.__class__.__name__}_{self.target.id}".lower()
+        # only ids travel through the queue, the objects are loaded by the worker
+        if context is None:
+            context = [target]
 
-    def reset(self):
-        from sliver.exchange import Exchange
+        self.kind = target._meta.table_name
+        self.id = target.id
+        self.call = call if call is not None else "refresh"
+        self.context_refs = [(c._meta.table_name, c.id) for c in context]
+        self.refs = {
+            k: (v._meta.table_name, v.id)
+            for k, v in kwargs.items()
+            if isinstance(v, peewee.Model)
+        }
+        self.kwargs = {k: v for k, v in kwargs.items() if k not in self.refs}
+        self.log_context = f"{target.__class__.__name__}_{target.id}".lower()
+        self.target = None
+        self.context = []
+
+    def get_refs(self):
+        return [(self.kind, self.id)] + self.context_refs + list(self.refs.values())
+
+    @staticmethod
+    def fetch(refs):
         from sliver.exchanges.factory import ExchangeFactory
+        from sliver.market import Market
         from sliver.position import Position
-        from sliver.strategies.factory import StrategyFactory
         from sliver.strategy import BaseStrategy
 
-        if self.target._meta.table_name == "exchange":
-            target = Exchange.get(id=self.target.id)
-            self.target = ExchangeFactory.from_base(target)
-            self.target.api = None
-        if self.target._meta.table_name == "strategy":
-            target = BaseStrategy.get(id=self.target.id)
-            self.target = StrategyFactory.from_base(target)
-
-        for c in self.context:
-            if c._meta.table_name == "strategy":
-                new = BaseStrategy.get(id=c.id)
-                self.context[self.context.index(c)] = new
-            if c._meta.table_name == "position":
-                new = Position.get(id=c.id)
-                self.context[self.context.index(c)] = new
+        models = {
+            "market": Market,
+            "position": Position,
+            "strategy": BaseStrategy,
+        }
+
+        ids = {}
+        for kind, id in refs:
+            ids.setdefault(kind, set()).add(id)
+
+        objects = {}
+        for kind in ids:
+            if kind == "exchange":
+                loaded = ExchangeFactory.from_ids(ids[kind])
+            elif kind == "position":
+                loaded = {obj.id: obj for obj in Position.get_graph(ids[kind])}
+            else:
+                model = models[kind]
+                query = model.select().where(model.id << list(ids[kind]))
+                loaded = {obj.id: obj for obj in query}
+
+            for id, obj in loaded.items():
+                objects[(kind, id)] = obj
+
+        return objects
+
+    @staticmethod
+    def load(tasks):
+        objects = Task.fetch([ref for task in tasks for ref in task.get_refs()])
+
+        for task in tasks:
+            try:
+                task.reset(objects)
+            except BaseError:
+                # reported when the task runs and fails to load on its own
+                task.target = None
+
+    def reset(self, objects):
+        def get(kind, id):
+            try:
+                return objects[(kind, id)]
+            except KeyError:
+                raise BaseError(f"{kind} {id} not found")
+
+        self.context = [get(kind, id) for kind, id in self.context_refs]
+
+        for k, (kind, id) in self.refs.items():
+            self.kwargs[k] = get(kind, id)
+
+        self.target = get(self.kind, self.id)
+
+        self.loaded = {}
+        for kind, id in self.get_refs():
+            if kind in self.versions:
+                self.loaded[(kind, id)] = self.get_version(kind, objects[(kind, id)])
+
+    def get_version(self, kind, obj):
+        return tuple(getattr(obj, field) for field in self.versions[kind])
+
+    @staticmethod
+    def fetch_versions(tasks):
+        # current versions of the objects the tasks loaded, with a single query
+        # per table; rows that are gone have none
+        models = {"position": Position, "strategy": BaseStrategy}
+
+        refs = set()
+        for task in tasks:
+            refs |= set(task.loaded or {})
+
+        versions = {ref: None for ref in refs}
+        for kind, fields in Task.versions.items():
+            ids = [id for k, id in refs if k == kind]
+            if not ids:
+                continue
+
+            model = models[kind]
+            query = (
+                model.select(model.id, *[getattr(model, f) for f in fields])
+                .where(model.id << ids)
+                .tuples()
+            )
+            for id, *values in query:
+                versions[(kind, id)] = tuple(values)
+
+        return versions
+
+    def is_stale(self, versions):
+        return any(
+            ref in versions and versions[ref] != version
+            for ref, version in (self.loaded or {}).items()
+        )
 
     def run(self):
+        from sliver.exchanges.factory import ExchangeFactory
+        from sliver.strategies.factory import StrategyFactory
+
         try:
-            self.reset()
+            if self.target is None:
+                self.reset(Task.fetch(self.get_refs()))
+
+            if self.kind == "exchange":
+                ExchangeFactory.connect(self.target)
+            if self.kind == "strategy":
+                self.target = StrategyFactory.from_base(self.target)
 
             if self.call != "check_stops":
                 logging.info(
@@ -247,44 +645,109 @@ class Task:
 
 
 class Worker(multiprocessing.Process):
-    def __init__(self, proc_queue, log_queue):
+    batch_size = 32
+    steal_timeout = 1
+    recheck_interval = 5
+
+    def __init__(self, proc_queue, log_queue, queues=None):
         super().__init__()
         self.proc_queue = proc_queue
         self.log_queue = log_queue
+        self.queues = queues
         db.init()
 
+    def get_task(self):
+        if self.queues is None:
+            return self.proc_queue.get()
+
+        # when routing, wait on the worker's own queue and steal from the
+        # others whenever it sits idle
+        while True:
+            try:
+                return self.proc_queue.get(timeout=self.steal_timeout)
+            except queue.Empty:
+                pass
+
+            for q in self.queues:
+                if q is self.proc_queue:
+                    continue
+                try:
+                    return q.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get_tasks(self):
+        # block for the first task, then take whatever else is already queued so
+        # that the whole batch is loaded with a single query per table
+        tasks = [self.get_task()]
+
+        while len(tasks) < self.batch_size:
+            try:
+                tasks.append(self.proc_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        try:
+            Task.load(tasks)
+        except Exception as e:
+            # each task retries loading on its own and reports the error
+            logging.exception(e, exc_info=True)
+
+        return tasks
+
     def run(self):
         while True:
-            task = self.proc_queue.get()
-            logging.config.dictConfig(
-                {
-                    "version": 1,
-                    "disable_existing_loggers": True,
-                    "formatters": {
-                        "default": {
-                            "format": "%(asctime)s -- %(message)s",
-                            "datefmt": "%Y-%m-%d %H:%M:%S",
-                            "converter": time.gmtime,
-                        }
-                    },
-                    "filters": {
-                        "context": {
-                            "()": TaskFilter,
-                            "context": task.log_context,
-                        },
-                    },
-                    "handlers": {
-                        "queue": {
-                            "class": "logging.handlers.QueueHandler",
-                            "queue": self.log_queue,
-                            "filters": ["context"],
-                            "formatter": "default",
-                        }
+            tasks = self.get_tasks()
+            checked = time.monotonic()
+            versions = {}
+            ran = set()
+
+            for i, task in enumerate(tasks):
+                # once the batch has been running for a while, the versions of
+                # the objects left are fetched again, so that tasks whose objects
+                # were refreshed, postponed or disabled since are reloaded
+                if time.monotonic() - checked > self.recheck_interval:
+                    versions.update(Task.fetch_versions(tasks[i:]))
+                    checked = time.monotonic()
+
+                refs = {ref for ref in task.get_refs() if ref[0] in Task.versions}
+                if refs & ran or task.is_stale(versions):
+                    # also reloaded when an earlier task ran on the same instances
+                    task.target = None
+                ran |= refs
+
+                self.run_task(task)
+
+    def run_task(self, task):
+        logging.config.dictConfig(
+            {
+                "version": 1,
+                "disable_existing_loggers": True,
+                "formatters": {
+                    "default": {
+                        "format": "%(asctime)s -- %(message)s",
+                        "datefmt": "%Y-%m-%d %H:%M:%S",
+                        "converter": time.gmtime,
+                    }
+                },
+                "filters": {
+                    "context": {
+                        "()": TaskFilter,
+                        "context": task.log_context,
                     },
-                    "root": {"handlers": ["queue"], "level": "INFO"},
-                }
-            )
-            task.run()
+                },
+                "handlers": {
+                    "queue": {
+                        "class": "logging.handlers.QueueHandler",
+                        "queue": self.log_queue,
+                        "filters": ["context"],
+                        "formatter": "default",
+                    }
+                },
+                "root": {"handlers": ["queue"], "level": "INFO"},
+            }
+        )
+        task.run()
 
 
 class LogHandler:
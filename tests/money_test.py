@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+import random
+from decimal import Decimal as D
+
+import numpy
+
+import sliver.money as money
+
+# reference implementations, as ExchangeAsset had them with Decimal
+
+
+def transform(value, prec):
+    if not value:
+        return 0
+    precision = D("10") ** D(str(prec))
+    return int(D(str(value)) * precision)
+
+
+def div(num, den, prec, precision):
+    div = int(D(str(num)) / D(str(den)) * 10**prec)
+
+    if prec == precision:
+        return div
+    else:
+        return transform(div, precision - prec)
+
+
+def format(value, precision, prec=None):
+    if not value:
+        return 0
+    if prec is None:
+        prec = precision
+    value = D(str(value)) * D("10") ** D(str(-1 * precision))
+    return value.quantize(D("10") ** D(str(-1 * prec)))
+
+
+rng = random.Random(1)
+
+
+def values(n=5000, digits=15):
+    for _ in range(n):
+        yield rng.randint(-(10**digits), 10**digits)
+
+
+def test_scale_ints():
+    for value in values():
+        prec = rng.randint(-8, 10)
+        assert money.scale(value, prec) == transform(value, prec)
+
+
+def test_scale_floats():
+    for value in values():
+        value = value / 10 ** rng.randint(0, 10)
+        prec = rng.randint(0, 10)
+        assert money.scale(value, prec) == transform(value, prec)
+
+
+def test_scale_decimals():
+    for value in values():
+        value = D(value).scaleb(-rng.randint(0, 12))
+        prec = rng.randint(-4, 10)
+        assert money.scale(value, prec) == transform(value, prec)
+
+
+def test_div():
+    for num in values():
+        den = rng.randint(1, 10**12) * rng.choice([1, -1])
+        precision = rng.randint(0, 8)
+        prec = rng.randint(0, precision)
+
+        q = money.div(num, den, prec)
+        if prec != precision:
+            q = money.rescale(q, prec, precision)
+
+        assert q == div(num, den, prec, precision)
+
+
+def test_div_by_zero():
+    try:
+        money.div(1, 0, 8)
+    except ZeroDivisionError:
+        return
+    assert False
+
+
+def test_to_decimal():
+    for value in values():
+        precision = rng.randint(0, 10)
+        prec = rng.choice([None, rng.randint(0, 10)])
+
+        expected = format(value, precision, prec)
+        result = money.to_decimal(value, precision, prec)
+
+        assert result == expected
+        assert str(result) == str(expected)
+
+
+def test_to_decimal_ties():
+    for value in [5, 15, 25, -5, -15, 125, 135]:
+        assert money.to_decimal(value, 1, 0) == format(value, 1, 0)
+
+
+def test_known_divisions():
+    # from asset_div_test
+    assert money.div(5000000000, 120000000000, 8) == 4166666
+    assert money.div(194751313964, 200000000, 8) == 97375656982
+    assert money.div(20353282988, 96900000, 8) == 21004420008
+    assert money.div(307833252386, 1991234000000, 8) == 15459421
+    assert money.rescale(money.div(5000000000, 120000000000, 4), 4, 8) == 4160000
+    assert money.div(409772, 485048052, 6) == 844
+
+
+def test_arrays():
+    num = numpy.array(list(values(digits=10)), dtype="int64")
+    den = numpy.array([rng.randint(1, 10**6) for _ in num], dtype="int64")
+
+    q = money.div_array(num, den, 6)
+    assert q.tolist() == [money.div(int(n), int(d), 6) for n, d in zip(num, den)]
+
+    r = money.rescale_array(num, 8, 2)
+    assert r.tolist() == [money.rescale(int(n), 8, 2) for n in num]
+
+    r = money.rescale_array(num, 2, 8)
+    assert r.tolist() == [money.rescale(int(n), 2, 8) for n in num]
+
+    floats = numpy.round(numpy.array([rng.random() * 1000 for _ in num]), 4)
+    s = money.scale_array(floats, 8)
+    assert s.tolist() == [transform(float(f), 8) for f in floats]
+
+    rendered = money.render_array(num, 8, 2)
+    assert rendered.tolist() == [float(format(int(n), 8, 2)) for n in num]
+
+
+def test_scale_array_magnitudes():
+    # decimals and their float neighbours, up to where scaled floats are far
+    # apart from each other
+    floats = []
+    for magnitude in [1e-4, 1, 1e4, 1e8, 1e10, 1e13]:
+        for _ in range(200):
+            value = round(rng.random() * magnitude, 4)
+            floats += [value, -value]
+            floats += [numpy.nextafter(value, numpy.inf), numpy.nextafter(value, 0)]
+    floats += [1e14 + 0.5, 0.29999999999999993, 2.675]
+
+    s = money.scale_array(floats, 4)
+    assert s.tolist() == [transform(float(f), 4) for f in floats]
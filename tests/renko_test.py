@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+import math
+
+import numpy
+import pandas
+
+from sliver.indicators.renko import RENKO, Renko
+
+
+def get_ohlc(n=2000, seed=1):
+    rng = numpy.random.default_rng(seed)
+    close = numpy.cumsum(rng.normal(0, 5, n)) + 1000
+    return pandas.DataFrame(
+        {
+            "time": pandas.date_range("2020-01-01", periods=n, freq="15min"),
+            "open": numpy.roll(close, 1),
+            "close": close,
+        }
+    )
+
+
+def test_bricks():
+    ohlc = pandas.DataFrame(
+        {
+            "time": range(6),
+            "open": [100, 100, 104, 120, 112, 96],
+            "close": [100, 104, 120, 112, 96, 105],
+        }
+    )
+    bricks = RENKO(ohlc, size=5)
+
+    # 100 to 120 lays 4 green bricks, whose first wick is the lowest close
+    # since the start, then 96 turns down from the open of the last one
+    # and 105 is not enough to turn up again
+    assert bricks.time.tolist() == [2, 2, 2, 2, 4, 4, 4]
+    assert bricks.open.tolist() == [100, 105, 110, 115, 115, 110, 105]
+    assert bricks.close.tolist() == [105, 110, 115, 120, 110, 105, 100]
+    assert bricks.low.tolist() == [100, 105, 110, 115, 110, 105, 100]
+    assert bricks.high.tolist() == [105, 110, 115, 120, 115, 110, 105]
+
+
+def test_resume():
+    ohlc = get_ohlc()
+    bricks = RENKO(ohlc, size=10)
+    assert len(bricks) > 10
+
+    times = ohlc.time.tolist()
+    closes = ohlc.close.to_numpy()
+
+    renko = Renko(first=math.floor(ohlc.open.iloc[0] / 10) * 10, size=10)
+    resumed = []
+    for i in range(0, len(ohlc), 300):
+        renko = Renko.from_state(renko.get_state())
+        resumed += renko.update_many(times[i : i + 300], closes[i : i + 300])
+
+    assert pandas.DataFrame(resumed).equals(bricks)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+import json
+
+import numpy
+import pandas
+
+import sliver.indicators.stream as stream
+from sliver.indicators.atr import ATR
+from sliver.indicators.bb import BB
+from sliver.indicators.macd import MACD
+from sliver.indicators.rsi import RSI
+
+rng = numpy.random.default_rng(1)
+size = 2000
+close = numpy.cumsum(rng.normal(0, 5, size)) + 10000
+ohlc = pandas.DataFrame(
+    {
+        "open": numpy.roll(close, 1),
+        "high": close + rng.random(size) * 9,
+        "low": close - rng.random(size) * 9,
+        "close": close,
+    }
+)
+candles = {k: ohlc[k].to_numpy() for k in ohlc}
+
+
+def resume(indicator, values, at=size // 3):
+    # feeds the values in two runs, the second one restored from json
+    first = indicator.update_many(values[:at])
+    state = json.loads(json.dumps(indicator.get_state()))
+    second = stream.Stream.from_state(state).update_many(values[at:])
+    return numpy.concatenate([first, second])
+
+
+def resume_candles(indicator, at=size // 3):
+    first = indicator.update_many({k: v[:at] for k, v in candles.items()})
+    state = json.loads(json.dumps(indicator.get_state()))
+    second = stream.Stream.from_state(state).update_many(
+        {k: v[at:] for k, v in candles.items()}
+    )
+    return {f: numpy.concatenate([first[f], second[f]]) for f in first}
+
+
+def assert_close(values, expected):
+    assert numpy.allclose(values, expected, rtol=1e-10, atol=1e-9, equal_nan=True)
+
+
+def test_series():
+    series = ohlc.close.copy()
+    series.iloc[100] = numpy.nan
+
+    assert_close(resume(stream.SMA(20), series), series.rolling(20).mean())
+    assert_close(
+        resume(stream.STD(20, ddof=0), close), ohlc.close.rolling(20).std(ddof=0)
+    )
+    assert_close(resume(stream.STD(20), series), series.rolling(20).std())
+    assert_close(resume(stream.EMA(span=9), series), series.ewm(span=9).mean())
+    assert_close(resume(stream.EMA(com=50), series), series.ewm(50).mean())
+    assert_close(
+        resume(stream.EMA(span=9, min_periods=9, adjust=False), series),
+        series.ewm(span=9, min_periods=9, adjust=False).mean(),
+    )
+
+
+def test_candles():
+    for use_ema in [False, True]:
+        values = resume_candles(stream.BB(20, 2, use_ema))
+        expected = BB(ohlc, 20, 2, use_ema)
+        for field in ["ma", "bolu", "bold"]:
+            assert_close(values[field], expected[field])
+
+        values = resume_candles(stream.MACD(12, 26, 9, use_ema))
+        expected = MACD(ohlc, 12, 26, 9, use_ema)
+        for field in ["macd", "macd_signal"]:
+            assert_close(values[field], expected[field])
+
+    assert_close(resume_candles(stream.RSI(14))["rsi"][1:], RSI(ohlc.close, 14))
+
+    # as pandas_ta's rsi and ema
+    delta = ohlc.close.diff()
+    gains = delta.clip(lower=0).ewm(alpha=1 / 14, min_periods=14).mean()
+    losses = delta.clip(upper=0).abs().ewm(alpha=1 / 14, min_periods=14).mean()
+    expected = 100 * gains / (gains + losses)
+    assert_close(resume_candles(stream.RSI(14, ewm=True))["rsi"], expected)
+
+    seeded = ohlc.close.copy()
+    seeded.iloc[:8] = numpy.nan
+    seeded.iloc[8] = ohlc.close.iloc[:9].mean()
+    expected = seeded.ewm(span=9, adjust=False).mean()
+    assert_close(resume(stream.SeededEMA(9), close), expected)
+
+    for smoothing in ["sma", "ema", "rma"]:
+        values = resume_candles(stream.ATR(14, smoothing))
+        assert_close(values["atr"], ATR(ohlc, 14, smoothing).atr)